@@ -0,0 +1,184 @@
+"""Tests for load_reference against a local stand-in for the scraped pages.
+
+The fixtures are the three pages reduced to the table each question scrapes;
+cleaning them reproduces the CSVs checked in next to zxxxxx.py.
+
+Run from the repository root with:  python -m unittest discover ass1/tests
+"""
+import contextlib
+import hashlib
+import http.server
+import importlib.util
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+here = Path(__file__).resolve().parent
+ass1 = here.parent
+fixtures = here / 'fixtures'
+
+spec = importlib.util.spec_from_file_location('ass1_zxxxxx', ass1 / 'zxxxxx.py')
+z = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(z)
+
+pages = {
+    'cost_of_living.csv': ('/cost_of_living.html', z.clean_cost_table, 7 * 24 * 3600),
+    'exchange_rates.csv': ('/exchange_rates.html', z.clean_currency_table, 24 * 3600),
+    'country_codes.csv': ('/country_codes.html', z.clean_country_table, 30 * 24 * 3600),
+}
+
+
+class FixtureServer(http.server.ThreadingHTTPServer):
+    """Serves tests/fixtures with strong ETags and answers If-None-Match."""
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FixtureHandler)
+        self.bodies = {f'/{path.name}': path.read_bytes() for path in fixtures.glob('*.html')}
+        self.requests = []
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.server_address[1]}{path}'
+
+
+class FixtureHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.server.bodies[self.path]
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        self.server.requests.append((self.path, self.headers.get('If-None-Match')))
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LoadReferenceTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FixtureServer()
+        self.work = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.work, 'cache')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.work)
+
+    def load(self, name, **kwargs):
+        path, clean, ttl = pages[name]
+        kwargs.setdefault('ttl', ttl)
+        return z.load_reference(os.path.join(self.work, name), self.server.url(path), clean,
+                                cache_dir=self.cache_dir, **kwargs)
+
+    def meta(self, name):
+        with open(os.path.join(self.cache_dir, name + '.json')) as f:
+            return json.load(f)
+
+    def age(self, name, seconds):
+        meta = self.meta(name)
+        meta['fetched_at'] -= seconds
+        with open(os.path.join(self.cache_dir, name + '.json'), 'w') as f:
+            json.dump(meta, f)
+
+    def test_cold_load_scrapes_the_checked_in_tables(self):
+        for name in pages:
+            with self.subTest(name=name):
+                df = self.load(name)
+                expected = pd.read_csv(ass1 / name)
+                pd.testing.assert_frame_equal(pd.read_csv(os.path.join(self.work, name)), expected)
+                pd.testing.assert_frame_equal(pd.read_csv(io.StringIO(df.to_csv(index=False))), expected)
+        self.assertEqual([path for path, _ in self.server.requests], [pages[name][0] for name in pages])
+
+    def test_question_functions_use_the_cache(self):
+        os.chdir(self.work)
+        self.addCleanup(os.chdir, ass1)
+        with mock.patch.object(z, 'load_reference', wraps=z.load_reference) as load, \
+                contextlib.redirect_stdout(io.StringIO()):
+            z.question_3('exchange_rates.csv', self.server.url('/exchange_rates.html'))
+            z.question_3('exchange_rates.csv', self.server.url('/exchange_rates.html'))
+        self.assertEqual(load.call_count, 2)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_warm_load_makes_no_request(self):
+        first = self.load('cost_of_living.csv')
+        self.server.requests.clear()
+        second = self.load('cost_of_living.csv')
+        self.assertEqual(self.server.requests, [])
+        pd.testing.assert_frame_equal(first, second)
+
+    def test_expired_entry_revalidates_with_etag(self):
+        self.load('exchange_rates.csv')
+        etag = self.meta('exchange_rates.csv')['etag']
+        self.age('exchange_rates.csv', 2 * 24 * 3600)
+        self.server.requests.clear()
+        self.load('exchange_rates.csv')
+        self.assertEqual(self.server.requests, [('/exchange_rates.html', etag)])
+        self.assertLess(time.time() - self.meta('exchange_rates.csv')['fetched_at'], 60)
+
+    def test_changed_page_rewrites_the_csv(self):
+        self.load('exchange_rates.csv')
+        self.age('exchange_rates.csv', 2 * 24 * 3600)
+        body = self.server.bodies['/exchange_rates.html'].decode('utf-8')
+        self.server.bodies['/exchange_rates.html'] = body.replace('0.6840', '0.7000').encode('utf-8')
+        df = self.load('exchange_rates.csv')
+        self.assertIn(0.7, pd.to_numeric(df['31 dec 23*'], errors='coerce').tolist())
+        written = pd.read_csv(os.path.join(self.work, 'exchange_rates.csv'))
+        self.assertIn(0.7, pd.to_numeric(written['31 dec 23*'], errors='coerce').tolist())
+        self.assertEqual(len(list(Path(self.cache_dir).glob('*.pkl'))), 0)
+        self.load('exchange_rates.csv')
+        self.assertEqual(len(list(Path(self.cache_dir).glob('*.pkl'))), 1)
+
+    def test_failed_refetch_serves_stale_and_backs_off(self):
+        expected = self.load('country_codes.csv')
+        self.age('country_codes.csv', 31 * 24 * 3600)
+        self.server.shutdown()
+        self.server.server_close()
+        with mock.patch.object(z, '_fetch_html', wraps=z._fetch_html) as fetch:
+            for _ in range(3):
+                pd.testing.assert_frame_equal(self.load('country_codes.csv', retry_delay=60), expected)
+            self.assertEqual(fetch.call_count, 1)
+            meta = self.meta('country_codes.csv')
+            self.assertEqual(meta['failures'], 1)
+            self.assertAlmostEqual(meta['retry_after'] - time.time(), 60, delta=5)
+
+            # once the back-off has passed the next call tries again and doubles it
+            meta['retry_after'] = time.time() - 1
+            with open(os.path.join(self.cache_dir, 'country_codes.csv.json'), 'w') as f:
+                json.dump(meta, f)
+            self.load('country_codes.csv', retry_delay=60)
+            self.assertEqual(fetch.call_count, 2)
+            meta = self.meta('country_codes.csv')
+            self.assertEqual(meta['failures'], 2)
+            self.assertAlmostEqual(meta['retry_after'] - time.time(), 120, delta=5)
+
+    def test_successful_refetch_clears_the_back_off(self):
+        self.load('cost_of_living.csv')
+        meta = self.meta('cost_of_living.csv')
+        meta.update(fetched_at=0, failures=3, retry_after=0)
+        with open(os.path.join(self.cache_dir, 'cost_of_living.csv.json'), 'w') as f:
+            json.dump(meta, f)
+        self.load('cost_of_living.csv')
+        meta = self.meta('cost_of_living.csv')
+        self.assertNotIn('failures', meta)
+        self.assertNotIn('retry_after', meta)
+
+
+if __name__ == '__main__':
+    unittest.main()
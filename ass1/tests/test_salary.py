@@ -0,0 +1,93 @@
+"""Tests for the AUD conversion and the salary cube.
+
+Run from the repository root with:  python -m unittest discover ass1/tests
+"""
+import contextlib
+import importlib.util
+import io
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+here = Path(__file__).resolve().parent
+
+spec = importlib.util.spec_from_file_location('ass1_zxxxxx_salary', here.parent / 'zxxxxx.py')
+z = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(z)
+
+# as question_3 returns it: units of each currency per 1 AUD on 31 Dec 23
+currency_df = pd.DataFrame({
+    'country': ['United States', 'Japan'],
+    'rate': [0.6840, 96.7700],
+    'currency': ['United States dollar', 'Japanese yen'],
+})
+
+
+def jobs(**columns):
+    df = pd.DataFrame({
+        'work_year': [2023, 2022, 2023],
+        'salary': [30000, 30000, 4_000_000],
+        'salary_currency': ['USD', 'USD', 'JPY'],
+        'salary_in_usd': [30000, 30000, 27000],
+    })
+    return df.assign(**columns)
+
+
+class SalaryInAudTest(unittest.TestCase):
+    def setUp(self):
+        self.rates = z.RateTable(currency_df)
+
+    def test_convert_divides_by_the_rate(self):
+        aud = self.rates.convert([684.0, 9677.0], pd.Series(['USD', 'JPY']), [2023, 2023])
+        np.testing.assert_allclose(aud, [1000.0, 100.0])
+
+    def test_usd_and_native_modes_agree(self):
+        usd_jobs = jobs().iloc[:2]
+        native = z.add_salary_in_aud(usd_jobs, self.rates, year=None, native=True)
+        usd = z.add_salary_in_aud(usd_jobs, self.rates, year=None)
+        self.assertEqual(native['salary_in_aud'].tolist(), [43859, 43859])
+        self.assertEqual(usd['salary_in_aud'].tolist(), native['salary_in_aud'].tolist())
+
+    def test_year_filter(self):
+        self.assertEqual(z.add_salary_in_aud(jobs(), self.rates)['work_year'].tolist(), [2023, 2023])
+
+    def test_question_8_keeps_its_specified_conversion(self):
+        df = z._question_8_salary_in_aud(jobs(), self.rates)
+        self.assertEqual(df['salary_in_aud'].tolist(), [int(30000 * 0.6840), int(27000 * 0.6840)])
+
+
+class SalaryCubeTest(unittest.TestCase):
+    def setUp(self):
+        self.jobs = pd.DataFrame({
+            'country': ['Australia', 'Australia', 'Germany', 'Germany', None],
+            'experience_rating': [1, 2, 1, 1, 1],
+            'work_year': [2023, 2023, None, 2023, 2023],
+            'company_size': pd.Categorical(['S', None, 'M', 'L', 'S']),
+            'remote_ratio': [np.nan, np.nan, 0, 100, 0],
+            'salary_in_aud': [100000, 150000, 90000, 110000, 50000],
+        })
+
+    def test_pivot_matches_question_11_with_missing_extra_dimensions(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = z.question_11(self.jobs.copy())
+        pivot = z.SalaryCube().add(self.jobs).pivot()
+        pd.testing.assert_frame_equal(pivot, expected, check_names=False)
+        self.assertEqual(pivot.loc['Australia', 2], 150000)
+
+    def test_missing_values_are_a_level_of_their_own(self):
+        cube = z.SalaryCube().add(self.jobs)
+        counts = cube.query('remote_ratio', None, stat='count')
+        self.assertEqual(counts[np.nan], 2)
+        self.assertEqual(counts[0], 1)
+        self.assertEqual(cube.query('country', None, where={'remote_ratio': [0, 100]}, stat='count').to_dict(),
+                         {'Germany': 2})
+
+    def test_rows_missing_a_required_dimension_are_skipped(self):
+        cube = z.SalaryCube().add(self.jobs)
+        self.assertEqual(int(cube.counts.sum()), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,10 +4,15 @@
 # Third-party libraries
 # NOTE: You may **only** use the following third-party libraries:
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import numpy as np
 import pandas as pd 
 from thefuzz import fuzz
-from thefuzz import process
+from thefuzz.utils import full_process
+# rapidfuzz is the matching engine thefuzz wraps (pinned in requirements.txt)
+from rapidfuzz import fuzz as rfuzz
+from rapidfuzz import process as rprocess
 # NOTE: It isn't necessary to use all of these to complete the assignment, 
 # but you are free to do so, should you choose.
 
@@ -17,7 +22,14 @@ from thefuzz import process
 # https://docs.python.org/3.12/library/index.html
 from pathlib import Path
 # ... import your standard libraries here ...
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import io
+import json
 import os
+import time
+import urllib.error
+import urllib.request
 
 
 ######################################################
@@ -45,8 +57,770 @@ def log(question, output_df, other):
 ######################################################
 # NOTE: YOU MAY ADD ANY HELPER FUNCTIONS BELOW ...
 ######################################################
+country_aliases_csv = f"{studentid}-country_aliases.csv"
 
 
+def match_countries(names, choices, score_cutoff=90, aliases_csv=country_aliases_csv):
+    """Resolve country names to their best fuzzy match among choices.
+
+    Gives the same answer as calling thefuzz's process.extractOne(name,
+    choices, score_cutoff=score_cutoff) for every name, but each distinct
+    name is scored only once, in a single rapidfuzz cdist matrix, and the
+    results are remembered in an alias CSV so later runs skip the scoring.
+
+    Args:
+        names (Series): Country names to resolve, possibly repeated or NaN.
+        choices (list): Candidate country names, in lookup order.
+        score_cutoff (int): Minimum WRatio score for a match.
+        aliases_csv (str): Path of the persistent alias table, or None.
+
+    Returns:
+        dict: Maps each distinct non-null name to its match, or None.
+    """
+    choices = list(choices)
+    choices_key = hashlib.sha1(
+        "\n".join(map(str, choices + [score_cutoff])).encode()).hexdigest()
+
+    aliases = {}
+    alias_df = pd.DataFrame(columns=['name', 'match', 'choices_key'])
+    if aliases_csv and os.path.exists(aliases_csv):
+        alias_df = pd.read_csv(aliases_csv, dtype=str, keep_default_na=False)
+        current = alias_df[alias_df['choices_key'] == choices_key]
+        aliases = {n: (m or None) for n, m in zip(current['name'], current['match'])}
+
+    pending = [n for n in pd.unique(names.dropna()) if n not in aliases]
+    if pending and choices:
+        # extractOne processes the query once itself and then rapidfuzz runs
+        # the ascii-forcing processor over both query and choices
+        queries = [full_process(full_process(n), force_ascii=True) for n in pending]
+        targets = [full_process(c, force_ascii=True) for c in choices]
+        scores = rprocess.cdist(queries, targets, scorer=rfuzz.WRatio,
+                                score_cutoff=score_cutoff, dtype=np.float64, workers=-1)
+        best = scores.argmax(axis=1)
+        found = scores[np.arange(len(pending)), best] >= score_cutoff
+        new = {n: (choices[b] if f else None) for n, b, f in zip(pending, best, found)}
+    else:
+        new = dict.fromkeys(pending)
+    aliases.update(new)
+
+    if aliases_csv and new:
+        new_df = pd.DataFrame({'name': list(new),
+                               'match': [m or '' for m in new.values()],
+                               'choices_key': choices_key})
+        pd.concat([alias_df, new_df], ignore_index=True).to_csv(aliases_csv, index=False)
+
+    return aliases
+
+
+def _hll_hashes(values):
+    """64-bit hashes of a Series' values, stable across chunks and dtypes."""
+    if pd.api.types.is_numeric_dtype(values):
+        values = values.astype('float64')
+    else:
+        values = values.astype(str)
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+def hll_registers(precision=14):
+    """Create an empty HyperLogLog sketch with 2**precision registers."""
+    return np.zeros(1 << precision, dtype=np.uint8)
+
+
+def hll_add(registers, values):
+    """Fold the values of a Series into a HyperLogLog sketch in place.
+
+    Args:
+        registers (ndarray): Sketch created by hll_registers.
+        values (Series): Non-null values to add.
+
+    Returns:
+        ndarray: The updated registers.
+    """
+    p = int(len(registers)).bit_length() - 1
+    h = _hll_hashes(values)
+    idx = (h >> np.uint64(64 - p)).astype(np.intp)
+    # the remaining 64 - p bits fit exactly in a float64, so frexp gives
+    # their bit length and hence the position of the leftmost 1-bit
+    _, bit_length = np.frexp((h & np.uint64((1 << (64 - p)) - 1)).astype(np.float64))
+    rank = (64 - p + 1 - bit_length).astype(np.uint8)
+    np.maximum.at(registers, idx, rank)
+    return registers
+
+
+def hll_count(registers):
+    """Estimate the number of distinct values added to a HyperLogLog sketch."""
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.ldexp(1.0, -registers.astype(int)).sum()
+    zeros = np.count_nonzero(registers == 0)
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * np.log(m / zeros)
+    return int(round(estimate))
+
+
+def _profile_frame(columns, observations, distinct, missing):
+    return pd.DataFrame({
+        'observations': pd.Series(observations, index=columns, dtype='int64'),
+        'distinct': pd.Series(distinct, index=columns, dtype='int64'),
+        'missing': pd.Series(missing, index=columns, dtype='int64'),
+    }, index=columns)
+
+
+def profile_columns(df, approx_above=None):
+    """Count observations, distinct values and missing values per column.
+
+    The null mask is computed once for the whole frame and missing is
+    derived from it, instead of scanning every column three times.
+
+    Args:
+        df (DataFrame): The frame to profile.
+        approx_above (int): If set, columns with more non-null values than
+                            this get an approximate HyperLogLog distinct count.
+
+    Returns:
+        DataFrame: One row per column of df with observations, distinct and
+                   missing columns.
+    """
+    observations = df.notna().sum()
+    missing = len(df) - observations
+    exact = list(df.columns)
+    distinct = {}
+    if approx_above is not None:
+        exact = [c for c in df.columns if observations[c] <= approx_above]
+        for c in df.columns.difference(exact, sort=False):
+            distinct[c] = hll_count(hll_add(hll_registers(), df[c].dropna()))
+    distinct.update(df[exact].nunique())
+    return _profile_frame(df.columns, observations, distinct, missing)
+
+
+def profile_csv(path, chunksize=100_000, approx_above=None, **read_csv_kwargs):
+    """Profile a CSV file chunk by chunk, like profile_columns.
+
+    Only the per-column counters and distinct value sets are kept between
+    chunks, so files larger than memory can be profiled.  With approx_above
+    set, a column switches from an exact set to a HyperLogLog sketch once it
+    has seen more than that many distinct values.
+
+    Args:
+        path (str): Path to the CSV file.
+        chunksize (int): Rows read per chunk.
+        approx_above (int): Distinct values to track exactly per column.
+        read_csv_kwargs: Extra arguments for pd.read_csv.
+
+    Returns:
+        DataFrame: The same summary profile_columns returns.
+    """
+    columns = None
+    observations = missing = None
+    seen = {}
+    for chunk in pd.read_csv(path, chunksize=chunksize, **read_csv_kwargs):
+        counts = chunk.notna().sum()
+        if columns is None:
+            columns = chunk.columns
+            observations = counts
+            missing = len(chunk) - counts
+            seen = {c: set() for c in columns}
+        else:
+            observations += counts
+            missing += len(chunk) - counts
+        for c in columns:
+            values = chunk[c].dropna()
+            if isinstance(seen[c], set):
+                seen[c].update(pd.unique(values))
+                if approx_above is not None and len(seen[c]) > approx_above:
+                    folded = pd.Series(list(seen[c])).infer_objects()
+                    seen[c] = hll_add(hll_registers(), folded)
+            else:
+                hll_add(seen[c], values)
+
+    if columns is None:
+        columns = pd.read_csv(path, nrows=0, **read_csv_kwargs).columns
+        return _profile_frame(columns, 0, 0, 0)
+    distinct = {c: len(v) if isinstance(v, set) else hll_count(v) for c, v in seen.items()}
+    return _profile_frame(columns, observations, distinct, missing)
+
+
+# Explicit dtypes for ds_jobs.csv: the short code columns become categoricals
+# and the small integers are downcast.  salary stays int64 since salaries in
+# some native currencies do not fit in 32 bits.
+jobs_schema = {
+    'work_year': 'int16',
+    'experience_level': 'category',
+    'employment_type': 'category',
+    'job_title': 'category',
+    'salary': 'int64',
+    'salary_currency': 'category',
+    'salary_in_usd': 'int32',
+    'employee_residence': 'category',
+    'remote_ratio': 'int8',
+    'company_location': 'category',
+    'company_size': 'category',
+}
+
+
+def read_jobs(jobs_csv, engine='c', **read_csv_kwargs):
+    """Read the jobs CSV with the compact jobs_schema dtypes.
+
+    Args:
+        jobs_csv (str): Path to the jobs CSV file.
+        engine (str): pd.read_csv parser, 'c' or 'pyarrow' (needs pyarrow).
+        read_csv_kwargs: Extra arguments for pd.read_csv, e.g. chunksize.
+
+    Returns:
+        DataFrame: The jobs DataFrame.
+    """
+    return pd.read_csv(jobs_csv, dtype=jobs_schema, engine=engine, **read_csv_kwargs)
+
+
+def _sort_categories(s):
+    """Put a categorical Series' categories in lexical order, as groupby on
+    the equivalent object column would see them."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.reorder_categories(s.cat.categories.sort_values())
+    return s
+
+
+experience_ratings = {
+    'EN': 1,
+    'MI': 2,
+    'SE': 3,
+    'EX': 4
+}
+
+
+def add_experience_rating(df):
+    """Add the experience_rating column (question 6) to df in place."""
+    # on a categorical this maps the four categories, not every row
+    df['experience_rating'] = df['experience_level'].map(experience_ratings).to_numpy()
+    return df
+
+
+def join_countries(df, country_df):
+    """Left-join the country names onto df by employee residence (question 7).
+
+    Country codes are unique, so the join is done as a lookup over the
+    residence categories; a merge is only needed for a table with
+    duplicate codes.
+    """
+    residence = df['employee_residence']
+    if isinstance(residence.dtype, pd.CategoricalDtype):
+        residence = residence.map(str.lower)
+    else:
+        residence = residence.str.lower()
+    df['employee_residence'] = residence
+
+    lookup = country_df.set_index('code')
+    if not lookup.index.is_unique:
+        df = df.merge(country_df, how='left', left_on='employee_residence', right_on='code')
+        return df.drop(columns='code')
+    for column in lookup.columns:
+        df[column] = _sort_categories(residence.map(lookup[column]))
+    return df
+
+
+# ISO 4217 codes for the currency names on the exchange rates page
+currency_codes = {
+    'australian dollar': 'AUD',
+    'canadian dollar': 'CAD',
+    'chinese renminbi': 'CNY',
+    'european euro': 'EUR',
+    'hong kong dollar': 'HKD',
+    'indian rupee': 'INR',
+    'indonesian rupiah': 'IDR',
+    'japanese yen': 'JPY',
+    'malaysian ringgit': 'MYR',
+    'new taiwan dollar': 'TWD',
+    'new zealand dollar': 'NZD',
+    'philippine peso': 'PHP',
+    'singapore dollar': 'SGD',
+    'south korean won': 'KRW',
+    'swiss franc': 'CHF',
+    'thai baht': 'THB',
+    'uk pound sterling': 'GBP',
+    'united states dollar': 'USD',
+    'vietnamese dong': 'VND',
+}
+
+# question_3 renames the 31 Dec 23 column to 'rate'
+rate_column_date = '2023-12-31'
+
+
+class RateTable:
+    """AUD exchange rates indexed by ISO currency code and date.
+
+    A rate is units of the foreign currency per 1 AUD, as on the RBA page,
+    so convert() divides: aud = amount / rate.  The rates are held in one
+    (currency, date) NumPy array, forward filled along the dates, so a
+    lookup is an index take plus a searchsorted and needs no Python per row.
+    Each row gets the latest rate dated on or before the end of its year, or
+    the earliest rate for years before the table starts.
+
+    question_3 drops the 30 Jun 23 column and both columns it keeps are
+    dated 31 Dec 23, so with that table every year gets the Dec 2023 rate.
+    """
+
+    def __init__(self, currency_df):
+        """Index the currency DataFrame returned in question 3.
+
+        The 'rate' column is dated rate_column_date and every other column
+        whose header parses as a date ('31 dec 23*') adds rates for that
+        date; where two columns share a date the first non-missing rate wins.
+        """
+        # the scraped names use non-breaking spaces in places
+        names = currency_df['currency'].str.lower().str.split().str.join(' ')
+        codes = names.map(currency_codes)
+        known = codes.notna().to_numpy()
+        dated = {'rate': pd.Timestamp(rate_column_date)}
+        for column in currency_df.columns.difference(['country', 'currency', 'rate'], sort=False):
+            date = pd.to_datetime(column.rstrip('*'), format='%d %b %y', errors='coerce')
+            if not pd.isna(date):
+                dated[column] = date
+
+        self.codes = pd.Index(sorted(set(codes[known]) | {'AUD'}))
+        self.dates = np.array(sorted(set(dated.values())), dtype='datetime64[D]')
+        rates = np.full((len(self.codes), len(self.dates)), np.nan)
+        rows = self.codes.get_indexer(codes[known])
+        for column, date in dated.items():
+            col = np.searchsorted(self.dates, np.datetime64(date, 'D'))
+            values = pd.to_numeric(currency_df[column], errors='coerce').to_numpy()[known]
+            fill = np.isnan(rates[rows, col])
+            rates[rows[fill], col] = values[fill]
+        rates[self.codes.get_loc('AUD')] = 1.0
+        self.rates = pd.DataFrame(rates).ffill(axis=1).bfill(axis=1).to_numpy()
+
+    def _code_index(self, currencies):
+        if isinstance(currencies, str):
+            return np.int64(self.codes.get_indexer([currencies])[0])
+        if isinstance(currencies.dtype, pd.CategoricalDtype):
+            # look the categories up once and spread them with the codes
+            lookup = np.append(self.codes.get_indexer(currencies.cat.categories), -1)
+            return lookup[currencies.cat.codes.to_numpy()]
+        return self.codes.get_indexer(currencies)
+
+    def lookup(self, currencies, years):
+        """Rates for each (currency, year) pair.
+
+        Args:
+            currencies (Series or str): ISO currency codes, or one code.
+            years (Series): Work years.
+
+        Returns:
+            ndarray: The rates, NaN where the currency is not in the table.
+        """
+        year_ends = (np.asarray(years, dtype='int64') - 1970 + 1).astype('datetime64[Y]').astype('datetime64[D]') - 1
+        col = np.maximum(np.searchsorted(self.dates, year_ends, side='right') - 1, 0)
+        row = np.broadcast_to(self._code_index(currencies), col.shape)
+        rates = self.rates[row, col]
+        rates[row < 0] = np.nan
+        return rates
+
+    def convert(self, amounts, currencies, years):
+        """Convert amounts in the given currencies and years to AUD."""
+        return np.asarray(amounts, dtype='float64') / self.lookup(currencies, years)
+
+
+def add_salary_in_aud(df, rates, year=2023, native=False):
+    """Add the salary_in_aud column, converted with RateTable.convert.
+
+    Args:
+        df (DataFrame): The jobs DataFrame.
+        rates (RateTable): The exchange rates.
+        year (int): Keep only the jobs of this work year, or None for all.
+        native (bool): Convert salary from salary_currency; jobs in
+                       currencies without a rate are dropped.  Otherwise
+                       salary_in_usd is converted from USD.
+
+    Returns:
+        DataFrame: The kept jobs with salary_in_aud added.
+    """
+    if year is not None:
+        df = df[df['work_year'] == year]
+    if native:
+        aud = rates.convert(df['salary'], df['salary_currency'], df['work_year'])
+        df, aud = df[~np.isnan(aud)], aud[~np.isnan(aud)]
+    else:
+        aud = rates.convert(df['salary_in_usd'], 'USD', df['work_year'])
+    return df.assign(salary_in_aud=aud.astype(int))
+
+
+def _question_8_salary_in_aud(df, rates):
+    """salary_in_aud as question 8 specifies it.
+
+    Keeps the 2023 jobs and multiplies salary_in_usd by the USD rate.  That
+    is the opposite direction to add_salary_in_aud, but the expected output
+    of questions 8 to 11 depends on it, so it is only used for them.
+    """
+    df = df[df['work_year'] == 2023]
+    aud = df['salary_in_usd'].to_numpy(dtype='float64') * rates.lookup('USD', df['work_year'])
+    return df.assign(salary_in_aud=aud.astype(int))
+
+
+def join_cost_of_living(df, cost_dict, matches):
+    """Add the cost_of_living column to df in place (question 10).
+
+    Args:
+        df (DataFrame): Jobs with a country column.
+        cost_dict (dict): Cost of living index by cost-of-living country name.
+        matches (dict): Country name to cost_dict key, from match_countries.
+    """
+    df['cost_of_living'] = df['country'].map(matches).map(cost_dict).astype('float64')
+    return df
+
+
+def salary_pivot(mean_table):
+    """Finish a country x experience_rating mean salary table as question 11 does."""
+    pivot_table = mean_table.fillna(0).astype(int)
+    pivot_table.index = pivot_table.index.astype(object)
+    # a slice may not have every rating
+    by = [r for r in [(1), (2), (3), (4)] if r in pivot_table.columns]
+    pivot_table.sort_values(by=by, ascending=[False] * len(by), inplace=True)
+    return pivot_table
+
+
+class SalaryCube:
+    """Materialised salary_in_aud sums and counts over a few job dimensions.
+
+    The cube keeps one dense int64 array of sums and one of counts with an
+    axis per dimension, so a batch of jobs is merged with a single bincount
+    and any slice or roll-up is a take and a sum over small arrays, never
+    a rescan of the jobs.  Rows missing the salary or a required dimension
+    (the ones question 11 groups by) are skipped, as groupby skips them; a
+    missing value in any other dimension is kept as a level of its own, so
+    the question 11 roll-up still counts the job.  A cube pickles with
+    pd.to_pickle.
+    """
+
+    def __init__(self, dims=('country', 'experience_rating', 'work_year', 'company_size', 'remote_ratio'),
+                 required=('country', 'experience_rating')):
+        self.dims = tuple(dims)
+        self.required = tuple(required)
+        self.levels = [pd.Index([]) for _ in self.dims]
+        self.sums = np.zeros((0,) * len(self.dims), dtype=np.int64)
+        self.counts = np.zeros((0,) * len(self.dims), dtype=np.int64)
+
+    def _grow(self, axis, n):
+        pad = [(0, 0)] * len(self.dims)
+        pad[axis] = (0, n)
+        self.sums = np.pad(self.sums, pad)
+        self.counts = np.pad(self.counts, pad)
+
+    def add(self, df):
+        """Merge a batch of jobs with a salary_in_aud column into the cube."""
+        keep = df['salary_in_aud'].notna()
+        for dim in self.required:
+            keep &= df[dim].notna()
+        codes = []
+        for axis, dim in enumerate(self.dims):
+            values = pd.Index(df[dim][keep])
+            code = self.levels[axis].get_indexer(values)
+            if (code < 0).any():
+                new = pd.Index(list(pd.unique(values[code < 0])))
+                self.levels[axis] = self.levels[axis].append(new) if len(self.levels[axis]) else new
+                self._grow(axis, len(new))
+                code = self.levels[axis].get_indexer(values)
+            codes.append(code)
+
+        shape = self.sums.shape
+        flat = np.ravel_multi_index(codes, shape)
+        salaries = df['salary_in_aud'][keep].to_numpy(dtype='float64')
+        self.sums += np.bincount(flat, weights=salaries, minlength=self.sums.size).reshape(shape).round().astype(np.int64)
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(shape)
+        return self
+
+    def query(self, index='country', columns='experience_rating', where=None, stat='mean'):
+        """Roll the cube up to index x columns, optionally sliced first.
+
+        Args:
+            index (str): Dimension for the rows.
+            columns (str): Dimension for the columns, or None for a Series.
+            where (dict): Dimension to the value, or list of values, to keep.
+            stat (str): 'mean', 'sum' or 'count'.
+
+        Returns:
+            DataFrame: The aggregate, with only the rows and columns that
+                       have jobs, both sorted.
+        """
+        sums, counts, levels = self.sums, self.counts, list(self.levels)
+        for dim, wanted in (where or {}).items():
+            axis = self.dims.index(dim)
+            pos = levels[axis].get_indexer(np.atleast_1d(wanted))
+            pos = pos[pos >= 0]
+            sums, counts = sums.take(pos, axis=axis), counts.take(pos, axis=axis)
+            levels[axis] = levels[axis][pos]
+
+        keep = [self.dims.index(index)] + ([self.dims.index(columns)] if columns else [])
+        rest = tuple(a for a in range(len(self.dims)) if a not in keep)
+        sums, counts = sums.sum(axis=rest), counts.sum(axis=rest)
+        if columns and keep[0] > keep[1]:
+            sums, counts = sums.T, counts.T
+
+        if stat == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = np.where(counts > 0, sums / counts, np.nan)
+        else:
+            values = {'sum': sums, 'count': counts}[stat]
+
+        rows = levels[keep[0]].rename(index)
+        if not columns:
+            return pd.Series(values, index=rows)[counts > 0].sort_index()
+        table = pd.DataFrame(values, index=rows, columns=levels[keep[1]].rename(columns))
+        table = table.loc[counts.sum(axis=1) > 0, counts.sum(axis=0) > 0]
+        return table.sort_index().sort_index(axis=1)
+
+    def pivot(self, **where):
+        """The question 11 pivot table, optionally over a slice of the cube."""
+        return salary_pivot(self.query('country', 'experience_rating', where))
+
+
+def run_streaming(jobs_csv, country_df, currency_df, cost_df, chunksize=50_000, cube=None):
+    """Run questions 6, 7, 8, 10 and 11 over the jobs CSV chunk by chunk.
+
+    Each chunk is rated, joined to its country, converted to AUD and joined
+    to the cost of living, then merged into a SalaryCube of salary sums and
+    counts, so memory is bounded by chunksize rather than by the size of
+    the file.
+
+    Args:
+        jobs_csv (str): Path to the jobs CSV file.
+        country_df (DataFrame): The country codes DataFrame from question 4.
+        currency_df (DataFrame): The currency DataFrame from question 3.
+        cost_df (DataFrame): The cost of living DataFrame from question 9.
+        chunksize (int): Rows read per chunk.
+        cube (SalaryCube): Cube to merge the jobs into, e.g. one holding
+                           earlier batches.  A new one is used if None.
+
+    Returns:
+        DataFrame: The same pivot table question 11 returns, over all the
+                   jobs in the cube.
+    """
+    if cube is None:
+        cube = SalaryCube()
+    rates = RateTable(currency_df)
+    cost_dict = cost_df.set_index('country')['cost_of_living_plus_rent_index'].to_dict()
+    matches = {}
+    for chunk in read_jobs(jobs_csv, chunksize=chunksize):
+        chunk = join_countries(add_experience_rating(chunk), country_df)
+        chunk = _question_8_salary_in_aud(chunk, rates)
+        unseen = chunk['country'][~chunk['country'].isin(matches.keys())]
+        if len(unseen.dropna()):
+            matches.update(match_countries(unseen, cost_dict.keys(), score_cutoff=90))
+        chunk = join_cost_of_living(chunk, cost_dict, matches).dropna(subset=['cost_of_living'])
+        cube.add(chunk)
+
+    return cube.pivot()
+
+
+reference_cache_dir = f"{studentid}-cache"
+
+
+def _sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _fetch_html(url, etag=None, last_modified=None, timeout=30):
+    """GET url, conditionally if a validator is given.
+
+    Returns:
+        tuple: (html, etag, last_modified); html is None if the server
+               answered 304 Not Modified.
+    """
+    req = urllib.request.Request(url)
+    if etag:
+        req.add_header('If-None-Match', etag)
+    if last_modified:
+        req.add_header('If-Modified-Since', last_modified)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            html = resp.read().decode(resp.headers.get_content_charset() or 'utf-8')
+            return html, resp.headers.get('ETag'), resp.headers.get('Last-Modified')
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, etag, last_modified
+        raise
+
+
+def load_reference(csv_path, url, clean, ttl, cache_dir=reference_cache_dir, retry_delay=300):
+    """Load a scraped reference table through a local cache.
+
+    The CSV stays the source of truth, as the questions require, but each
+    version of it is also stored as a pickle named after the CSV's sha256,
+    so a warm load only hashes the file instead of parsing it.  Once the
+    CSV is older than ttl the page is fetched again with If-None-Match /
+    If-Modified-Since; a 304 just renews the entry, a new page is scraped,
+    cleaned and written over the CSV.  If the refetch fails the stale CSV
+    is used and the failure is recorded, so the next attempt waits
+    retry_delay seconds, doubling per consecutive failure up to ttl.
+
+    Args:
+        csv_path (str): Path of the CSV the table is saved to.
+        url (str): URL of the page to scrape the table from.
+        clean (function): Turns the list of tables from pd.read_html into
+                          the DataFrame to save.
+        ttl (int): Seconds before the CSV is checked against the URL again.
+        cache_dir (str): Directory for the pickles and their metadata.
+        retry_delay (int): Seconds to wait after a first failed refetch.
+
+    Returns:
+        DataFrame: The reference table.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path = os.path.join(cache_dir, Path(csv_path).name + '.json')
+    stored_meta = {}
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            stored_meta = json.load(f)
+    meta = dict(stored_meta)
+    old_digest = meta.get('sha256')
+
+    digest = _sha256(csv_path) if os.path.exists(csv_path) else None
+    if digest and digest != old_digest:
+        # the CSV was written outside the cache, e.g. checked in; date it by mtime
+        meta = {'sha256': digest, 'fetched_at': os.path.getmtime(csv_path)}
+
+    df = None
+    now = time.time()
+    if digest is None or (now - meta['fetched_at'] >= ttl and now >= meta.get('retry_after', 0)):
+        try:
+            html, etag, last_modified = _fetch_html(
+                url, meta.get('etag') if digest else None, meta.get('last_modified') if digest else None)
+        except (OSError, ValueError):
+            if digest is None:
+                raise
+            # back off instead of waiting on the network on every call
+            failures = meta.get('failures', 0) + 1
+            meta.update(failures=failures, retry_after=now + min(retry_delay * 2 ** (failures - 1), ttl))
+        else:
+            meta.pop('failures', None)
+            meta.pop('retry_after', None)
+            meta.update(etag=etag, last_modified=last_modified, fetched_at=time.time())
+            if html is not None:
+                df = clean(pd.read_html(io.StringIO(html)))
+                df.to_csv(csv_path, index=False)
+                digest = meta['sha256'] = _sha256(csv_path)
+
+    if meta != stored_meta:
+        # the pickle of a previous version of the CSV is no longer reachable
+        old_pickle = os.path.join(cache_dir, f"{old_digest}.pkl")
+        if old_digest != digest and os.path.exists(old_pickle):
+            os.remove(old_pickle)
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+    if df is not None:
+        return df
+
+    pickle_path = os.path.join(cache_dir, f"{digest}.pkl")
+    if os.path.exists(pickle_path):
+        return pd.read_pickle(pickle_path)
+    df = pd.read_csv(csv_path)
+    df.to_pickle(pickle_path)
+    return df
+
+
+def clean_cost_table(tables):
+    """Clean the scraped cost of living table (question 2)."""
+    df = tables[0]
+    df.columns = [c.lower().replace(' ', '_') for c in df.columns]
+    return df
+
+
+def clean_currency_table(tables):
+    """Clean the scraped currency conversion rates table (question 3)."""
+    df = tables[0]
+
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(-1)
+    df.columns = df.columns.str.replace('\xa0', ' ', regex=True)
+    column_remove = '30 Jun 23'
+    if column_remove in df.columns:
+        df.drop(columns=[column_remove], inplace=True)
+    column_rename = '31 Dec 23'
+    if column_rename in df.columns:
+        df.rename(columns={column_rename: 'rate'}, inplace=True)
+
+    df.columns = df.columns.str.lower()
+    return df
+
+
+def clean_country_table(tables):
+    """Clean the scraped country codes table (question 4)."""
+    df = tables[0]
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(-1)
+
+    df.columns = df.columns.str.replace('\xa0', ' ', regex=True)
+    df.rename(columns=lambda x: x.strip().lower().replace(' ', '_'), inplace=True)
+    columns_remove = ['year', 'cctld', 'notes']
+    df.drop(columns=columns_remove, inplace=True)
+
+    df.rename(columns={'country_name_(using_title_case)': 'country'}, inplace=True)
+    df['code'] = df['code'].str.lower()
+    return df
+
+
+
+def country_aggregates(jobs_df):
+    """Average salary_in_aud and cost_of_living, and job count, per country.
+
+    Args:
+        jobs_df (DataFrame): The jobs DataFrame returned in question 10.
+
+    Returns:
+        DataFrame: One row per country with salary_in_aud, cost_of_living
+                   and job_count columns.
+    """
+    grouped = jobs_df.groupby('country', observed=True)[['salary_in_aud', 'cost_of_living']].mean()
+    job_counts = jobs_df['country'].value_counts()
+    return grouped.join(job_counts.rename('job_count'))
+
+
+def draw_salary_chart(ax, plot_data):
+    """Draw the question 12 salary vs cost of living chart onto ax."""
+    ax.scatter(plot_data['cost_of_living'], plot_data['salary_in_aud'], s=plot_data['job_count']*10,  alpha=0.5)
+    ax.set_title('Average Salary and Cost of Living by Country')
+    ax.set_xlabel('Cost of Living ')
+    ax.set_ylabel('Average Salary in AUD')
+    ax.grid(True)
+    for country, x, y in zip(plot_data.index, plot_data['cost_of_living'], plot_data['salary_in_aud']):
+        ax.annotate(country, (x, y))
+
+
+def _render_salary_chart(job):
+    """Render one chart on its own Agg canvas; runs in a worker process."""
+    plot_data, path = job
+    start = time.perf_counter()
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    draw_salary_chart(fig.add_subplot(), plot_data)
+    fig.savefig(path)
+    return time.perf_counter() - start
+
+
+def render_salary_charts(jobs_df, subsets, out_dir='.', workers=None):
+    """Render the question 12 chart for many subsets of countries.
+
+    The per-country aggregates are computed once and each chart only gets
+    its own rows of them.  Every chart is drawn on a private Figure with the
+    Agg canvas rather than pyplot's global state, so charts can be rendered
+    side by side in worker processes without leaking figures.
+
+    Args:
+        jobs_df (DataFrame): The jobs DataFrame returned in question 10.
+        subsets (list): Lists of country names, one per chart.
+        out_dir (str): Directory the PNG files are written to.
+        workers (int): Worker processes, None for one per CPU.
+
+    Returns:
+        DataFrame: The path, countries and render time in seconds of each
+                   chart, in the order of subsets.
+    """
+    aggregates = country_aggregates(jobs_df)
+    paths = [os.path.join(out_dir, f"{studentid}-Q12-{i}.png") for i in range(len(subsets))]
+    jobs = [(aggregates[aggregates.index.isin(countries)], path) for countries, path in zip(subsets, paths)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        seconds = list(pool.map(_render_salary_chart, jobs))
+    return pd.DataFrame({'path': paths, 'countries': list(subsets), 'seconds': seconds})
+
 
 ######################################################
 # QUESTIONS TO COMPLETE BELOW ...
@@ -70,7 +844,7 @@ def question_1(jobs_csv):
     ######################################################
     # TODO: Your code goes here ...
     ######################################################
-    df = pd.read_csv('ds_jobs.csv')
+    df = read_jobs(jobs_csv)
 
     ######################################################
     # NOTE: DO NOT MODIFY THE CODE BELOW ...
@@ -100,13 +874,7 @@ def question_2(cost_csv, cost_url):
     ######################################################
     # TODO: Your code goes here ...
     ######################################################
-    if not os.path.exists(cost_csv):
-        dfs = pd.read_html(cost_url)
-        df = dfs[0]
-        df.columns = [c.lower().replace(' ', '_') for c in df.columns]
-        df.to_csv(cost_csv, index=False)
-    else:
-        df = pd.read_csv(cost_csv)
+    df = load_reference(cost_csv, cost_url, clean_cost_table, ttl=7 * 24 * 3600)
 
     ######################################################
     # NOTE: DO NOT MODIFY THE CODE BELOW ...
@@ -136,24 +904,7 @@ def question_3(currency_csv, currency_url):
     ######################################################
     # TODO: Your code goes here ...
     ######################################################
-    if not os.path.exists(currency_csv):
-        df_list = pd.read_html(currency_url)
-        df = df_list[0]
-
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = df.columns.get_level_values(-1)
-        df.columns = df.columns.str.replace('\xa0', ' ', regex=True)
-        column_remove = '30 Jun 23'
-        if column_remove in df.columns:
-            df.drop(columns=[column_remove], inplace=True)
-        column_rename = '31 Dec 23'
-        if column_rename in df.columns:
-            df.rename(columns={column_rename: 'rate'}, inplace=True)
-        
-        df.columns = df.columns.str.lower()
-        df.to_csv(currency_csv, index=False)
-    else:
-        df = pd.read_csv(currency_csv)
+    df = load_reference(currency_csv, currency_url, clean_currency_table, ttl=24 * 3600)
 
     ######################################################
     # NOTE: DO NOT MODIFY THE CODE BELOW ...
@@ -182,23 +933,7 @@ def question_4(country_csv, country_url):
     ######################################################
     # TODO: Your code goes here ...
     ######################################################
-    if not os.path.exists(country_csv):
-        df_list = pd.read_html(country_url)
-        df = df_list[0]
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = df.columns.get_level_values(-1)
-
-        df.columns = df.columns.str.replace('\xa0', ' ', regex=True)
-        df.rename(columns=lambda x: x.strip().lower().replace(' ', '_'), inplace=True)
-        columns_remove = ['year', 'cctld', 'notes']
-        df.drop(columns=columns_remove, inplace=True)
-
-        df.rename(columns={'country_name_(using_title_case)': 'country'}, inplace=True)
-        df['code'] = df['code'].str.lower()
-        df.to_csv(country_csv, index=False)
-
-    else:
-        df = pd.read_csv(country_csv)
+    df = load_reference(country_csv, country_url, clean_country_table, ttl=30 * 24 * 3600)
 
     ######################################################
     # NOTE: DO NOT MODIFY THE CODE BELOW ...
@@ -225,13 +960,8 @@ def question_5(jobs_df):
     ######################################################
     # TODO: Your code goes here ...
     ######################################################
-    df = pd.DataFrame(columns=['observations', 'distinct', 'missing'])
-    for column in jobs_df.columns:
-        observations = jobs_df[column].notnull().sum()
-        distinct = jobs_df[column].nunique()
-        missing = jobs_df[column].isnull().sum()
-        df.loc[column] = [observations, distinct, missing]
-    
+    df = profile_columns(jobs_df)
+
     ######################################################
     # NOTE: DO NOT MODIFY THE CODE BELOW ...
     ######################################################
@@ -257,15 +987,7 @@ def question_6(jobs_df):
     ######################################################
     # TODO: Your code goes here ...
     ######################################################
-    df=jobs_df.copy()
-    rating = {
-        'EN': 1,
-        'MI': 2,
-        'SE': 3,
-        'EX': 4
-    }
-    
-    df['experience_rating'] = df['experience_level'].map(rating)
+    df = add_experience_rating(jobs_df.copy())
 
     ######################################################
     # NOTE: DO NOT MODIFY THE CODE BELOW ...
@@ -294,12 +1016,8 @@ def question_7(jobs_df, country_df):
     ######################################################
     # TODO: Your code goes here ...
     ######################################################
-    df=jobs_df.copy()
-    df['employee_residence'] = df['employee_residence'].str.lower()
-    df = df.merge(country_df, how='left', left_on='employee_residence', right_on='code')
-    df.rename(columns={'country': 'country'}, inplace=True)
-    df.drop(columns='code', inplace=True)
-    
+    df = join_countries(jobs_df.copy(), country_df)
+
     ######################################################
     # NOTE: DO NOT MODIFY THE CODE BELOW ...
     ######################################################
@@ -329,10 +1047,7 @@ def question_8(jobs_df, currency_df):
     # TODO: Your code goes here ...
     ######################################################
     # Filter to only consider the work year 2023
-    df = jobs_df[jobs_df['work_year'] == 2023].copy()
-    currency_df['rate'] = pd.to_numeric(currency_df['rate'], errors='coerce')
-    rate = currency_df[currency_df['currency'].str.contains('United States', case=False)]['rate'].iloc[0]
-    df['salary_in_aud'] = (df['salary_in_usd'] * rate).astype(int)
+    df = _question_8_salary_in_aud(jobs_df, RateTable(currency_df))
 
     ######################################################
     # NOTE: DO NOT MODIFY THE CODE BELOW ...
@@ -392,19 +1107,8 @@ def question_10(jobs_df, cost_df):
     # TODO: Your code goes here ...
     ######################################################
     cost_dict = cost_df.set_index('country')['cost_of_living_plus_rent_index'].to_dict()
-    col_values = []
-
-    for country in jobs_df['country']:
-        match = process.extractOne(country, cost_dict.keys(), score_cutoff=90)
-        if match:
-            cost_of_living = cost_dict[match[0]]
-        else:
-            cost_of_living = None
-        
-        col_values.append(cost_of_living)
-
-    jobs_df['cost_of_living'] = col_values
-    df = jobs_df.dropna(subset=['cost_of_living'])
+    matches = match_countries(jobs_df['country'], cost_dict.keys(), score_cutoff=90)
+    df = join_cost_of_living(jobs_df, cost_dict, matches).dropna(subset=['cost_of_living'])
     
     ######################################################
     # NOTE: DO NOT MODIFY THE CODE BELOW ...
@@ -436,13 +1140,11 @@ def question_11(jobs_df):
         values='salary_in_aud', 
         index='country', 
         columns='experience_rating', 
-        aggfunc='mean'
+        aggfunc='mean',
+        observed=True
     )
     
-    pivot_table.fillna(0, inplace=True)
-    pivot_table = pivot_table.astype(int)
-    pivot_table.sort_values(by=[(1), (2), (3), (4)], ascending=[False, False, False, False], inplace=True)
-    df = pivot_table.copy()
+    df = salary_pivot(pivot_table)
     ######################################################
     # NOTE: DO NOT MODIFY THE CODE BELOW ...
     ######################################################
@@ -467,19 +1169,10 @@ def question_12(jobs_df):
     # TODO: Your code goes here ...
     ######################################################
     studentid="zxxxxx"
-    df=jobs_df.copy()
     five_countries = ['Australia', 'France', 'Singapore', 'Spain', 'Ireland']
-    df = df[df['country'].isin(five_countries)]
-    grouped = df.groupby('country')[['salary_in_aud', 'cost_of_living']].mean()
-    job_counts = df['country'].value_counts()
-    plot_data = grouped.join(job_counts.rename('job_count'))
-    plt.scatter(plot_data['cost_of_living'], plot_data['salary_in_aud'], s=plot_data['job_count']*10,  alpha=0.5)
-    plt.title('Average Salary and Cost of Living by Country')
-    plt.xlabel('Cost of Living ')
-    plt.ylabel('Average Salary in AUD')
-    plt.grid(True)
-    for i, r in enumerate(plot_data.index):
-        plt.annotate(r, (plot_data['cost_of_living'].iloc[i], plot_data['salary_in_aud'].iloc[i]))
+    df = jobs_df[jobs_df['country'].isin(five_countries)]
+    plot_data = country_aggregates(df)
+    draw_salary_chart(plt.gca(), plot_data)
 
     ######################################################
     # NOTE: DO NOT MODIFY THE CODE BELOW ...
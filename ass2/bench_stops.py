@@ -0,0 +1,104 @@
+"""Load test for GET /stops/<id> against a copy of an ass2 module.
+
+The module is copied into a scratch directory with a fresh database of
+--stops rows, served by werkzeug's threaded server, and hit by --clients
+keep-alive connections for --seconds (plus optional PATCH --writers).  The
+include filter keeps next_departure out, so no upstream call is made.
+
+To compare the pooled SQLite layer with the original per-request
+connections:
+
+    git show <baseline>:ass2/zxxxxx.py > /tmp/zxxxxx_baseline.py
+    python ass2/bench_stops.py /tmp/zxxxxx_baseline.py
+    python ass2/bench_stops.py ass2/zxxxxx.py
+"""
+import argparse
+import http.client
+import importlib.util
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+
+def load_module(src):
+    work = tempfile.mkdtemp()
+    os.chdir(work)
+    shutil.copy(src, os.path.join(work, 'zxxxxx.py'))
+    # modules from before the lazy Gemini client need a key to import
+    os.environ.setdefault('GOOGLE_API_KEY', 'unused')
+    spec = importlib.util.spec_from_file_location('zxxxxx', os.path.join(work, 'zxxxxx.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['zxxxxx'] = module
+    spec.loader.exec_module(module)
+    logging.disable(logging.CRITICAL)
+    module.init_db()
+    return module
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('module', help='path of the ass2 module to serve')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=0)
+    parser.add_argument('--stops', type=int, default=1000)
+    args = parser.parse_args()
+
+    module = load_module(os.path.abspath(args.module))
+    first = 8000000
+    with sqlite3.connect(module.db_file) as conn:
+        conn.executemany('INSERT INTO stops (stop_id, name, latitude, longitude, last_updated) VALUES (?, ?, ?, ?, ?)',
+                         [(first + i, f'Stop {i}', 50 + i / 1000, 8 + i / 1000, '2024-01-01-00:00:00')
+                          for i in range(args.stops)])
+    server = make_server('127.0.0.1', 0, module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    stop = threading.Event()
+    latencies = []
+    errors = []
+
+    def reader():
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_port)
+        while not stop.is_set():
+            start = time.perf_counter()
+            conn.request('GET', f'/stops/{first + random.randrange(args.stops)}?include=name,latitude')
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+            latencies.append(time.perf_counter() - start)
+
+    def writer():
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_port)
+        while not stop.is_set():
+            conn.request('PATCH', f'/stops/{first + random.randrange(args.stops)}', body='{"name": "renamed"}',
+                         headers={'Content-Type': 'application/json'})
+            conn.getresponse().read()
+
+    threads = [threading.Thread(target=reader) for _ in range(args.clients)]
+    threads += [threading.Thread(target=writer) for _ in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    latencies.sort()
+    print(f'{len(latencies) / args.seconds:.0f} req/s  '
+          f'p50 {latencies[len(latencies) // 2] * 1e3:.2f} ms  '
+          f'p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.2f} ms  '
+          f'errors {len(errors)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""A local stand-in for the parts of transport.rest the API calls.
+
+FakeTransportRest serves canned /locations, /stops/<id>/departures,
+/journeys and /locations/nearby answers over HTTP/1.1 keep-alive.  Tests
+steer it through attributes: `fail` answers that many requests with
+`fail_status`, `delay` sleeps before answering, and `hits` / `connections`
+count requests and distinct client connections.
+"""
+import http.server
+import json
+import threading
+import time
+
+
+class FakeTransportRest(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeHandler)
+        self.lock = threading.Lock()
+        self.fail = 0
+        self.fail_status = 503
+        self.delay = 0.0
+        self.hits = 0
+        self.paths = []
+        self.connections = set()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits += 1
+            server.paths.append(self.path)
+            server.connections.add(self.client_address)
+            failing = server.fail > 0
+            if failing:
+                server.fail -= 1
+        if server.delay:
+            time.sleep(server.delay)
+        if failing:
+            self.reply(server.fail_status, {'message': 'unavailable'})
+        elif self.path.startswith('/locations/nearby'):
+            self.reply(200, [{'type': 'location', 'poi': True, 'name': 'Museum'},
+                             {'type': 'stop', 'poi': False, 'name': 'Hauptbahnhof'}])
+        elif self.path.startswith('/locations'):
+            self.reply(200, [{'type': 'stop', 'id': '8000105', 'name': 'Frankfurt(Main)Hbf',
+                              'location': {'latitude': 50.107145, 'longitude': 8.663789}}])
+        elif '/departures' in self.path:
+            self.reply(200, {'departures': []})
+        elif self.path.startswith('/journeys'):
+            self.reply(200, {'journeys': [{'legs': []}]})
+        else:
+            self.reply(404, {'message': 'not found'})
+
+    def reply(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,92 @@
+"""Tests for ConnectionPool across fork and for create_app being idempotent.
+
+Run from the repository root with:  python -m unittest discover ass2/tests
+"""
+import importlib.util
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+here = Path(__file__).resolve().parent
+
+spec = importlib.util.spec_from_file_location('ass2_zxxxxx_pool', here.parent / 'zxxxxx.py')
+z = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(z)
+logging.disable(logging.CRITICAL)
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.work = tempfile.mkdtemp()
+        self.pool = z.ConnectionPool(os.path.join(self.work, 'pool.db'), size=2)
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.work)
+
+    def test_connections_are_reused(self):
+        with self.pool.connection() as first:
+            pass
+        with self.pool.connection() as second:
+            pass
+        self.assertIs(first, second)
+
+    def test_close_empties_the_pool(self):
+        with self.pool.connection() as first:
+            pass
+        self.pool.close()
+        self.assertTrue(self.pool.idle.empty())
+        with self.pool.connection() as second:
+            pass
+        self.assertIsNot(first, second)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs fork')
+    def test_forked_child_does_not_use_inherited_connections(self):
+        with self.pool.connection() as parent:
+            parent.execute('CREATE TABLE t (x)')
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                with self.pool.connection() as child:
+                    child.execute('INSERT INTO t VALUES (1)')
+                os.write(write, b'fresh' if child is not parent else b'inherited')
+            finally:
+                os._exit(0)
+        os.close(write)
+        os.waitpid(pid, 0)
+        self.assertEqual(os.read(read, 16), b'fresh')
+        os.close(read)
+        with self.pool.connection() as conn:
+            self.assertIs(conn, parent)
+            self.assertEqual(conn.execute('SELECT x FROM t').fetchall()[0][0], 1)
+
+
+class CreateAppTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.work = tempfile.mkdtemp()
+        os.chdir(self.work)
+        z.app_ready = False
+
+    def tearDown(self):
+        z.db.close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.work)
+
+    def test_only_the_first_call_migrates_and_resumes(self):
+        with mock.patch.object(z, 'resume_guide_jobs') as resume:
+            self.assertIs(z.create_app(), z.app)
+            self.assertIs(z.create_app(), z.app)
+        self.assertEqual(resume.call_count, 1)
+        self.assertTrue(z.db.idle.empty())
+        with z.db.connection() as conn:
+            self.assertEqual(conn.execute('PRAGMA user_version').fetchone()[0], len(z.migrations))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""Tests for the background guide jobs: claiming, resuming and error mapping.
+
+Run from the repository root with:  python -m unittest discover ass2/tests
+"""
+import importlib.util
+import logging
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+here = Path(__file__).resolve().parent
+
+spec = importlib.util.spec_from_file_location('ass2_zxxxxx_jobs', here.parent / 'zxxxxx.py')
+z = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(z)
+logging.disable(logging.CRITICAL)
+
+
+def setUpModule():
+    global work, cwd
+    cwd = os.getcwd()
+    work = tempfile.mkdtemp()
+    os.chdir(work)
+    z.init_db()
+
+
+def tearDownModule():
+    os.chdir(cwd)
+    shutil.rmtree(work)
+
+
+def add_job(status, age=0):
+    job_id = uuid.uuid4().hex
+    when = (datetime.now() - timedelta(seconds=age)).strftime('%Y-%m-%d %H:%M:%S')
+    with z.db.connection() as conn:
+        conn.execute('INSERT INTO guide_jobs (job_id, status, created_at, updated_at) VALUES (?, ?, ?, ?)',
+                     (job_id, status, when, when))
+    return job_id
+
+
+def job(job_id):
+    with z.db.connection() as conn:
+        return conn.execute('SELECT status, http_status, message, guide FROM guide_jobs WHERE job_id = ?', (job_id,)).fetchone()
+
+
+class RunGuideJobTest(unittest.TestCase):
+    def setUp(self):
+        with z.db.connection() as conn:
+            conn.execute('DELETE FROM guide_jobs')
+
+    def test_job_runs_once_when_submitted_twice(self):
+        job_id = add_job('queued')
+        with mock.patch.object(z.TourismGuide, 'generate', return_value=(200, 'guide')) as generate:
+            z.run_guide_job(job_id)
+            z.run_guide_job(job_id)
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual((job(job_id)['status'], job(job_id)['guide']), ('done', 'guide'))
+
+    def test_running_job_is_not_claimed_again(self):
+        job_id = add_job('running')
+        with mock.patch.object(z.TourismGuide, 'generate') as generate:
+            z.run_guide_job(job_id)
+        generate.assert_not_called()
+        self.assertEqual(job(job_id)['status'], 'running')
+
+    def test_missing_api_key_fails_the_job_with_503(self):
+        job_id = add_job('queued')
+        with mock.patch.object(z.TourismGuide, 'generate', side_effect=z.ConfigurationError('GOOGLE_API_KEY is not set')):
+            z.run_guide_job(job_id)
+        self.assertEqual((job(job_id)['status'], job(job_id)['http_status']), ('failed', 503))
+
+    def test_unexpected_errors_fail_the_job_with_500(self):
+        job_id = add_job('queued')
+        with mock.patch.object(z.TourismGuide, 'generate', side_effect=ValueError('boom')):
+            z.run_guide_job(job_id)
+        self.assertEqual((job(job_id)['status'], job(job_id)['http_status']), ('failed', 500))
+
+
+class ResumeGuideJobsTest(unittest.TestCase):
+    def setUp(self):
+        with z.db.connection() as conn:
+            conn.execute('DELETE FROM guide_jobs')
+
+    def test_queued_and_stale_running_jobs_are_resumed(self):
+        queued = add_job('queued')
+        stale = add_job('running', age=z.guide_lease + 60)
+        live = add_job('running', age=10)
+        done = add_job('done')
+        with mock.patch.object(z.guide_pool, 'submit') as submit:
+            z.resume_guide_jobs()
+        self.assertEqual(sorted(call.args[1] for call in submit.call_args_list), sorted([queued, stale]))
+        self.assertEqual(job(stale)['status'], 'queued')
+        self.assertEqual(job(live)['status'], 'running')
+        self.assertEqual(job(done)['status'], 'done')
+
+    def test_running_job_from_a_dead_process_is_requeued_once_its_lease_expires(self):
+        # it was running when its process died, shortly before a restart
+        job_id = add_job('running', age=10)
+        with mock.patch.object(z.guide_pool, 'submit') as submit:
+            z.resume_guide_jobs()
+            self.assertEqual(job(job_id)['status'], 'running')
+            app = z.app.test_client()
+            self.assertEqual(app.get(f'/guide/jobs/{job_id}').json['status'], 'running')
+
+            # no heartbeat has refreshed it for a whole lease
+            with mock.patch.object(z, 'guide_lease', 5):
+                self.assertEqual(app.get(f'/guide/jobs/{job_id}').json['status'], 'queued')
+                self.assertEqual(app.get(f'/guide/jobs/{job_id}').json['status'], 'queued')
+        submit.assert_called_once_with(z.run_guide_job, job_id)
+
+    def test_queued_job_of_a_dead_process_is_resubmitted_when_polled(self):
+        job_id = add_job('queued', age=z.guide_lease + 60)
+        with mock.patch.object(z.TourismGuide, 'generate', return_value=(200, 'guide')), \
+                mock.patch.object(z.guide_pool, 'submit', side_effect=lambda fn, *args: fn(*args)):
+            z.app.test_client().get(f'/guide/jobs/{job_id}')
+        self.assertEqual(job(job_id)['status'], 'done')
+
+
+class HeartbeatTest(unittest.TestCase):
+    def test_running_job_keeps_its_lease_fresh(self):
+        job_id = add_job('queued')
+        seen = []
+
+        def generate(_):
+            with z.db.connection() as conn:
+                conn.execute("UPDATE guide_jobs SET updated_at = '2000-01-01 00:00:00' WHERE job_id = ?", (job_id,))
+            time.sleep(0.3)
+            with z.db.connection() as conn:
+                seen.append(conn.execute('SELECT updated_at FROM guide_jobs WHERE job_id = ?', (job_id,)).fetchone()[0])
+            return 200, 'guide'
+
+        with mock.patch.object(z, 'guide_lease', 0.15), mock.patch.object(z.TourismGuide, 'generate', generate):
+            z.run_guide_job(job_id)
+        self.assertNotEqual(seen[0], '2000-01-01 00:00:00')
+        self.assertEqual(job(job_id)['status'], 'done')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+"""Tests for the Prometheus text rendering of MetricsRegistry.
+
+Run from the repository root with:  python -m unittest discover ass2/tests
+"""
+import importlib.util
+import unittest
+from pathlib import Path
+
+here = Path(__file__).resolve().parent
+
+spec = importlib.util.spec_from_file_location('ass2_zxxxxx_metrics', here.parent / 'zxxxxx.py')
+z = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(z)
+
+
+class MetricsRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.metrics = z.MetricsRegistry()
+
+    def test_help_is_rendered_before_type(self):
+        self.metrics.describe('jobs_in_flight', 'Jobs running.\nPer process, C:\\ style.')
+        self.metrics.inc('jobs_in_flight')
+        lines = self.metrics.render().splitlines()
+        self.assertEqual(lines[:3], [
+            '# HELP jobs_in_flight Jobs running.\\nPer process, C:\\\\ style.',
+            '# TYPE jobs_in_flight gauge',
+            'jobs_in_flight 1',
+        ])
+
+    def test_metrics_without_help_only_get_type(self):
+        self.metrics.observe('work_seconds', 0.002)
+        self.assertTrue(self.metrics.render().startswith('# TYPE work_seconds histogram\n'))
+
+    def test_label_values_are_escaped(self):
+        self.metrics.inc('hits', route='/a"b\\c\nd')
+        self.assertIn('hits{route="/a\\"b\\\\c\\nd"} 1', self.metrics.render().splitlines())
+
+    def test_collectors_get_help(self):
+        self.metrics.describe('pool_idle', 'Idle connections.')
+        text = self.metrics.render([('pool_idle', 'gauge', [({'db': 'x'}, 3)])])
+        self.assertEqual(text, '# HELP pool_idle Idle connections.\n# TYPE pool_idle gauge\npool_idle{db="x"} 3\n')
+
+    def test_module_registry_describes_its_metrics(self):
+        for name in ('http_request_seconds', 'db_query_seconds', 'upstream_request_seconds', 'cache_hits_total'):
+            self.assertIn(name, z.metrics.help)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""Tests for GET /operator-profiles/<stop_id> with a stub Gemini model.
+
+Run from the repository root with:  python -m unittest discover ass2/tests
+"""
+import importlib.util
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+here = Path(__file__).resolve().parent
+
+spec = importlib.util.spec_from_file_location('ass2_zxxxxx_profiles', here.parent / 'zxxxxx.py')
+z = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(z)
+logging.disable(logging.CRITICAL)
+
+operators = ['DB Regio', 'S-Bahn Berlin', 'BVG', 'ODEG', 'Hanseatische Eisenbahn']
+
+
+def setUpModule():
+    global work, cwd
+    cwd = os.getcwd()
+    work = tempfile.mkdtemp()
+    os.chdir(work)
+    z.init_db()
+
+
+def tearDownModule():
+    os.chdir(cwd)
+    shutil.rmtree(work)
+
+
+class StubModel:
+    """Answers after the delay given for the operator named in the prompt."""
+    model_name = 'models/stub'
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.prompts = []
+        self.lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self.lock:
+            self.prompts.append(prompt)
+        name = next(name for name in self.delays if name in prompt)
+        time.sleep(self.delays[name])
+        return mock.Mock(text=f'**{name}** runs\ntrains.')
+
+
+class StubDepartures:
+    def get(self, stop_id, duration):
+        return {'departures': [{'line': {'operator': {'name': name}}} for name in operators + operators[:2]]}
+
+
+class OperatorProfilesTest(unittest.TestCase):
+    def use(self, delays, workers=5, timeout=5):
+        model = StubModel(delays)
+        pool = ThreadPoolExecutor(max_workers=workers)
+        self.addCleanup(pool.shutdown, cancel_futures=True)
+        with z.db.connection() as conn:
+            conn.execute('DELETE FROM llm_cache')
+        patches = [
+            mock.patch.object(z, 'departures_cache', StubDepartures()),
+            mock.patch.object(z, 'llm_cache', z.LLMCache(z.db, model)),
+            mock.patch.object(z, 'llm_pool', pool),
+            mock.patch.object(z, 'llm_timeout', timeout),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        return model
+
+    def test_profiles_are_generated_concurrently_in_departure_order(self):
+        self.use(dict(zip(operators, (0.1, 0.5, 0.2, 0.3, 0.4))))
+        start = time.perf_counter()
+        response = z.app.test_client().get('/operator-profiles/8000105')
+        elapsed = time.perf_counter() - start
+        self.assertEqual(response.status_code, 200)
+        profiles = response.json['profiles']
+        self.assertEqual([p['operator_name'] for p in profiles], operators)
+        self.assertEqual(profiles[0]['information'], 'DB Regio runs trains.')
+        self.assertLess(elapsed, 1.2)
+
+    def test_calls_still_queued_at_the_deadline_are_cancelled(self):
+        model = self.use(dict.fromkeys(operators, 0.3), workers=1, timeout=0.4)
+        response = z.app.test_client().get('/operator-profiles/8000105')
+        information = [p['information'] for p in response.json['profiles']]
+        self.assertEqual(information[0], 'DB Regio runs trains.')
+        self.assertEqual(information[2:], ['No information available.'] * 3)
+        time.sleep(0.5)
+        # the call running at the deadline finishes; the queued ones never start
+        self.assertEqual(len(model.prompts), 2)
+
+    def test_profile_breakdown_includes_time_in_the_pool(self):
+        self.use(dict.fromkeys(operators, 0.1))
+        response = z.app.test_client().get('/operator-profiles/8000105', headers={'X-Profile': '1'})
+        timings = dict(part.split(';dur=') for part in response.headers['Server-Timing'].split(', '))
+        # five concurrent 0.1 s calls, summed
+        self.assertGreaterEqual(float(timings['gemini']), 500)
+        self.assertIn('db', timings)
+        self.assertLess(float(timings['total']), float(timings['gemini']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+"""Tests for conditional GET /stops/<stop_id>.
+
+Run from the repository root with:  python -m unittest discover ass2/tests
+"""
+import importlib.util
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+here = Path(__file__).resolve().parent
+
+spec = importlib.util.spec_from_file_location('ass2_zxxxxx_etag', here.parent / 'zxxxxx.py')
+z = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(z)
+logging.disable(logging.CRITICAL)
+
+
+def setUpModule():
+    global work, cwd
+    cwd = os.getcwd()
+    work = tempfile.mkdtemp()
+    os.chdir(work)
+    z.init_db()
+    with z.db.connection() as conn:
+        conn.execute('INSERT INTO stops (stop_id, name, latitude, longitude, last_updated) VALUES (?, ?, ?, ?, ?)',
+                     (8000105, 'Frankfurt(Main)Hbf', 50.107145, 8.663789, '2024-01-01 00:00:00'))
+
+
+def tearDownModule():
+    os.chdir(cwd)
+    shutil.rmtree(work)
+
+
+class StopETagTest(unittest.TestCase):
+    url = '/stops/8000105?include=name,latitude'
+
+    def setUp(self):
+        self.app = z.app.test_client()
+        self.etag = self.app.get(self.url).headers['ETag']
+
+    def test_matching_etag_gives_304(self):
+        response = self.app.get(self.url, headers={'If-None-Match': self.etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], self.etag)
+
+    def test_weak_etag_also_matches(self):
+        response = self.app.get(self.url, headers={'If-None-Match': f'"other", W/{self.etag}'})
+        self.assertEqual(response.status_code, 304)
+
+    def test_other_etag_gives_the_stop(self):
+        response = self.app.get(self.url, headers={'If-None-Match': '"other"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['name'], 'Frankfurt(Main)Hbf')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+"""Tests for UpstreamClient against the local fake transport.rest server.
+
+Run from the repository root with:  python -m unittest discover ass2/tests
+"""
+import importlib.util
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+here = Path(__file__).resolve().parent
+sys.path.insert(0, str(here))
+
+from fake_transport_rest import FakeTransportRest  # noqa: E402
+
+spec = importlib.util.spec_from_file_location('ass2_zxxxxx', here.parent / 'zxxxxx.py')
+z = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(z)
+logging.disable(logging.CRITICAL)
+
+
+def setUpModule():
+    global work, cwd
+    cwd = os.getcwd()
+    work = tempfile.mkdtemp()
+    os.chdir(work)
+    z.init_db()
+
+
+def tearDownModule():
+    os.chdir(cwd)
+    shutil.rmtree(work)
+
+
+class UpstreamClientTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeTransportRest()
+        self.client = z.UpstreamClient(self.fake.url, retries=2, backoff=0.001, failure_threshold=3, reset_after=0.2)
+
+    def tearDown(self):
+        self.client.session.close()
+        self.fake.stop()
+
+    def test_connections_are_kept_alive(self):
+        for _ in range(20):
+            self.assertEqual(self.client.get('locations', '/locations', params={'query': 'Frankfurt'}).status_code, 200)
+        self.assertEqual(self.fake.hits, 20)
+        self.assertEqual(len(self.fake.connections), 1)
+
+    def test_server_errors_are_retried(self):
+        self.fake.fail = 2
+        response = self.client.get('departures', '/stops/8000105/departures')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.fake.hits, 3)
+
+    def test_rate_limits_are_retried(self):
+        self.fake.fail, self.fake.fail_status = 1, 429
+        self.assertEqual(self.client.get('journeys', '/journeys').status_code, 200)
+        self.assertEqual(self.fake.hits, 2)
+
+    def test_client_errors_are_not_retried(self):
+        self.assertEqual(self.client.get('locations', '/unknown').status_code, 404)
+        self.assertEqual(self.fake.hits, 1)
+
+    def test_last_response_is_returned_when_retries_run_out(self):
+        self.fake.fail = 10
+        self.assertEqual(self.client.get('journeys', '/journeys').status_code, 503)
+        self.assertEqual(self.fake.hits, 3)
+
+    def test_breaker_opens_per_endpoint_and_half_opens(self):
+        self.fake.fail = 10 ** 6
+        for _ in range(3):
+            self.client.get('journeys', '/journeys')
+        hits = self.fake.hits
+        with self.assertRaises(z.UpstreamUnavailable):
+            self.client.get('journeys', '/journeys')
+        self.assertEqual(self.fake.hits, hits)
+
+        # other endpoints keep their own circuit
+        self.fake.fail = 0
+        self.assertEqual(self.client.get('locations', '/locations').status_code, 200)
+
+        time.sleep(0.25)
+        self.assertEqual(self.client.get('journeys', '/journeys').status_code, 200)
+        self.assertEqual(self.client.get('journeys', '/journeys').status_code, 200)
+
+    def test_timeouts_raise_upstream_unavailable(self):
+        self.fake.delay = 0.5
+        self.client.timeouts = dict(self.client.timeouts, nearby=(1, 0.1))
+        start = time.perf_counter()
+        with self.assertRaises(z.UpstreamUnavailable):
+            self.client.get('nearby', '/locations/nearby')
+        self.assertLess(time.perf_counter() - start, 1.5)
+        self.assertEqual(self.fake.hits, 3)
+
+    def test_unreachable_server_raises_connection_error(self):
+        self.fake.stop()
+        client = z.UpstreamClient(self.fake.url, retries=1, backoff=0.001)
+        with self.assertRaises(z.requests.exceptions.ConnectionError):
+            client.get('locations', '/locations')
+
+
+class HandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeTransportRest()
+        self.saved = z.upstream, z.departures_cache
+        z.upstream = z.UpstreamClient(self.fake.url, retries=1, backoff=0.001)
+        z.departures_cache = z.DeparturesCache(z.upstream)
+        self.app = z.app.test_client()
+
+    def tearDown(self):
+        z.upstream, z.departures_cache = self.saved
+        self.fake.stop()
+
+    def test_put_stops_goes_through_the_client(self):
+        response = self.app.put('/stops?query=Frankfurt')
+        self.assertIn(response.status_code, (200, 201))
+        self.assertEqual(response.json[0]['stop_id'], 8000105)
+        self.assertEqual(self.fake.paths, ['/locations?query=Frankfurt'])
+
+    def test_put_stops_reports_503_when_upstream_is_down(self):
+        self.fake.stop()
+        response = self.app.put('/stops?query=Frankfurt')
+        self.assertEqual(response.status_code, 503)
+
+    def test_stop_departures_report_503_on_server_errors(self):
+        self.app.put('/stops?query=Frankfurt')
+        self.fake.fail = 10
+        response = self.app.get('/stops/8000105')
+        self.assertEqual(response.status_code, 503)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,60 +5,819 @@ Data publication as a RESTful service API
 Getting Started
 ---------------
 """
-from flask import Flask, request, Response, make_response, send_file
+from flask import Flask, request, Response, make_response, send_file, stream_with_context, g
 from flask_restx import Api, Resource, reqparse,fields
 import sqlite3
 import requests
-import tempfile
+import uuid
 from datetime import datetime,timezone,timedelta
 import logging
 import json
 from dotenv import load_dotenv
-import google.generativeai as genai
 import os
 from pathlib import Path
+import bisect
+import contextvars
+import hashlib
+import io
+import math
+import queue
+import random
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from itertools import combinations
 
 load_dotenv()
 studentid = Path(__file__).stem
 db_file  = f"{studentid}.db"
 txt_file = f"{studentid}.txt"
-genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
-gemini = genai.GenerativeModel('gemini-pro')
 
 app = Flask(__name__)
 api = Api(app, version='1.0', title='Tourism in Germany API', description='A smart API based on the Deutsche Bahn API')
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+
+class MetricsRegistry:
+    """In-process counters, gauges and histograms in Prometheus text format.
+
+    Each observation is a lock, a bisect and a few additions, cheap enough to
+    leave on.  While a request asked for profiling, timings made on its
+    thread, and on pool threads it submits to with submit_in_context, are
+    also summed into a per-request breakdown.  Concurrent calls add up, so
+    a component can exceed the request's total.
+    """
+    buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.gauges = {}
+        self.help = {}
+        self.breakdown = contextvars.ContextVar('breakdown', default=None)
+
+    def observe(self, name, seconds, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0] * (len(self.buckets) + 2)
+            counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            counts[-1] += seconds
+            # under the lock: pool threads of one request share the dict
+            breakdown = self.breakdown.get()
+            if breakdown is not None:
+                component = name.split('_', 1)[0]
+                breakdown[component] = breakdown.get(component, 0.0) + seconds
+
+    def describe(self, name, text):
+        """Set the # HELP text rendered for a metric."""
+        self.help[name] = text
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.gauges.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    @staticmethod
+    def _escape(value, quote=False):
+        # text-format escaping: backslash and newline, plus " inside label values
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n')
+        return value.replace('"', '\\"') if quote else value
+
+    @classmethod
+    def _labels(cls, key, extra=()):
+        pairs = list(key) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{k}="{cls._escape(v, quote=True)}"' for k, v in pairs) + '}'
+
+    def _header(self, lines, name, kind):
+        if name in self.help:
+            lines.append(f'# HELP {name} {self._escape(self.help[name])}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    def render(self, collectors=()):
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.histograms.items()):
+                self._header(lines, name, 'histogram')
+                for key, counts in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{self._labels(key, [("le", bound)])} {cumulative}')
+                    cumulative += counts[len(self.buckets)]
+                    lines.append(f'{name}_bucket{self._labels(key, [("le", "+Inf")])} {cumulative}')
+                    lines.append(f'{name}_sum{self._labels(key)} {counts[-1]:.6f}')
+                    lines.append(f'{name}_count{self._labels(key)} {cumulative}')
+            for name, series in sorted(self.gauges.items()):
+                self._header(lines, name, 'gauge')
+                for key, value in sorted(series.items()):
+                    lines.append(f'{name}{self._labels(key)} {value}')
+        for name, kind, samples in collectors:
+            self._header(lines, name, kind)
+            for labels, value in samples:
+                lines.append(f'{name}{self._labels(sorted(labels.items()))} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+metrics.describe('http_request_seconds', 'Time spent handling HTTP requests.')
+metrics.describe('http_requests_in_flight', 'HTTP requests currently being handled.')
+metrics.describe('db_query_seconds', 'Time spent executing SQLite statements.')
+metrics.describe('upstream_request_seconds', 'Time spent on transport.rest calls, including failed ones.')
+metrics.describe('gemini_request_seconds', 'Time spent waiting for the Gemini API.')
+metrics.describe('cache_hits_total', 'Lookups answered from a cache.')
+metrics.describe('cache_misses_total', 'Lookups that had to go to the source.')
+metrics.describe('cache_stale_hits_total', 'Departures served stale while being refreshed.')
+metrics.describe('db_pool_idle_connections', 'SQLite connections waiting in the pool.')
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection that reports each statement to `metrics`."""
+    def execute(self, sql, *args):
+        with metrics.timer('db_query_seconds', op=sql.split(None, 1)[0].upper()):
+            return super().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        with metrics.timer('db_query_seconds', op=sql.split(None, 1)[0].upper()):
+            return super().executemany(sql, *args)
+
+
+class ConnectionPool:
+    """Reusable SQLite connections, one checked out per thread at a time.
+
+    Connections are opened once in WAL mode with tuned pragmas and handed
+    from thread to thread, so a request neither pays for connect() nor
+    loses the connection's prepared statement cache.  The pool notices
+    when it is used from a forked child and starts over with fresh
+    connections, since SQLite handles must not cross a fork.
+    """
+    pragmas = (
+        'PRAGMA journal_mode = WAL',
+        'PRAGMA synchronous = NORMAL',
+        'PRAGMA cache_size = -8000',
+        'PRAGMA mmap_size = 67108864',
+        'PRAGMA temp_store = MEMORY',
+    )
+
+    def __init__(self, path, size=16):
+        self.path = path
+        self.size = size
+        self.pid = os.getpid()
+        self.idle = queue.LifoQueue(maxsize=size)
+        # connections inherited across fork; kept referenced so they are
+        # never used or closed in the child
+        self.inherited = []
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, cached_statements=256, factory=TimedConnection)
+        conn.row_factory = sqlite3.Row
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        return conn
+
+    def close(self):
+        """Close the idle connections, e.g. before the process forks."""
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection; commits on success, rolls back on error."""
+        if os.getpid() != self.pid:
+            self.inherited.append(self.idle)
+            self.pid = os.getpid()
+            self.idle = queue.LifoQueue(maxsize=self.size)
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            try:
+                self.idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+
+db = ConnectionPool(db_file)
+
+# Schema migrations, applied in order; PRAGMA user_version records how many
+# have run.  Append new ones, never edit old ones.
+migrations = [
+    '''
+    CREATE TABLE IF NOT EXISTS stops (
+        stop_id INTEGER PRIMARY KEY,
+        name TEXT,
+        latitude REAL,
+        longitude REAL,
+        last_updated TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS poi_cache (
+        cell TEXT PRIMARY KEY,
+        poi_names TEXT,
+        expires_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS poi_cache_expires_at ON poi_cache (expires_at)
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        prompt_key TEXT PRIMARY KEY,
+        model TEXT,
+        prompt TEXT,
+        response TEXT,
+        size INTEGER,
+        last_used REAL
+    );
+    CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)
+    ''',
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS stops_rtree USING rtree (
+        id, min_lat, max_lat, min_lon, max_lon
+    );
+    INSERT OR REPLACE INTO stops_rtree
+        SELECT stop_id, latitude, latitude, longitude, longitude FROM stops
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
+    CREATE TRIGGER IF NOT EXISTS stops_rtree_insert AFTER INSERT ON stops
+    WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL BEGIN
+        INSERT OR REPLACE INTO stops_rtree VALUES (NEW.stop_id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+    END;
+    CREATE TRIGGER IF NOT EXISTS stops_rtree_update AFTER UPDATE OF stop_id, latitude, longitude ON stops BEGIN
+        DELETE FROM stops_rtree WHERE id = OLD.stop_id;
+        INSERT INTO stops_rtree SELECT NEW.stop_id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+        WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+    END;
+    CREATE TRIGGER IF NOT EXISTS stops_rtree_delete AFTER DELETE ON stops BEGIN
+        DELETE FROM stops_rtree WHERE id = OLD.stop_id;
+    END
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS guide_jobs (
+        job_id TEXT PRIMARY KEY,
+        status TEXT,
+        http_status INTEGER,
+        message TEXT,
+        guide TEXT,
+        created_at TEXT,
+        updated_at TEXT
+    )
+    ''',
+]
+
+
 def init_db():
-    with sqlite3.connect(db_file) as conn:
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS stops (
-                stop_id INTEGER PRIMARY KEY,
-                name TEXT,
-                latitude REAL,
-                longitude REAL,
-                last_updated TEXT
-            )
-        ''')
+    with db.connection() as conn:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for number, script in enumerate(migrations[version:], start=version + 1):
+            conn.executescript(script)
+            conn.execute(f'PRAGMA user_version = {number}')
+
+
+class UpstreamUnavailable(requests.exceptions.ConnectionError):
+    """transport.rest could not be reached, or its circuit is open."""
+
+
+class UpstreamClient:
+    """Shared, pooled HTTP client for transport.rest.
+
+    One keep-alive Session serves every handler.  Each endpoint has its own
+    (connect, read) timeout and circuit breaker; failed calls (connection
+    errors, timeouts, 429 and 5xx) are retried a bounded number of times
+    with jittered exponential backoff.
+    """
+    timeouts = {
+        'locations': (3.05, 10),
+        'departures': (3.05, 10),
+        'journeys': (3.05, 20),
+        'nearby': (3.05, 10),
+    }
+
+    def __init__(self, base_url, pool_size=32, retries=2, backoff=0.2, failure_threshold=5, reset_after=30):
+        self.base_url = base_url.rstrip('/')
+        self.retries = retries
+        self.backoff = backoff
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.lock = threading.Lock()
+        self.failures = {}
+        self.opened_at = {}
+
+    def _allow(self, endpoint):
+        with self.lock:
+            opened_at = self.opened_at.get(endpoint)
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at >= self.reset_after:
+                # half open: let this call through as a probe
+                self.opened_at[endpoint] = time.monotonic()
+                return True
+            return False
+
+    def _record(self, endpoint, ok):
+        with self.lock:
+            if ok:
+                self.failures[endpoint] = 0
+                self.opened_at.pop(endpoint, None)
+            else:
+                self.failures[endpoint] = self.failures.get(endpoint, 0) + 1
+                if self.failures[endpoint] >= self.failure_threshold:
+                    self.opened_at[endpoint] = time.monotonic()
+
+    def get(self, endpoint, path, params=None):
+        if not self._allow(endpoint):
+            raise UpstreamUnavailable(f'circuit open for {endpoint}')
+        error = response = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            start = time.perf_counter()
+            try:
+                response = self.session.get(self.base_url + path, params=params, timeout=self.timeouts[endpoint])
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.observe('upstream_request_seconds', time.perf_counter() - start, endpoint=endpoint, status='error')
+                error, response = e, None
+                continue
+            metrics.observe('upstream_request_seconds', time.perf_counter() - start, endpoint=endpoint, status=response.status_code)
+            if response.status_code != 429 and response.status_code < 500:
+                self._record(endpoint, True)
+                return response
+        self._record(endpoint, False)
+        if response is not None:
+            return response
+        raise UpstreamUnavailable(str(error)) from error
+
+
+upstream = UpstreamClient(os.environ.get('TRANSPORT_REST_URL', 'https://v6.db.transport.rest'))
+
+
+class DeparturesCache:
+    """Bounded LRU cache of /stops/{id}/departures keyed by (stop_id, duration).
+
+    Entries younger than `ttl` are served as is.  Entries younger than
+    `stale_ttl` are still served, but trigger a single background refresh.
+    Departures with a platform are parsed once per refresh, so picking the
+    next departure on a hit is a short scan.
+    """
+    def __init__(self, client, maxsize=512, ttl=30, stale_ttl=120):
+        self.client = client
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.entries = OrderedDict()
+        self.refreshing = set()
+        self.lock = threading.Lock()
+        self.hits = self.stale_hits = self.misses = 0
+
+    def _fetch(self, stop_id, duration):
+        params = {'duration': duration} if duration is not None else None
+        response = self.client.get('departures', f'/stops/{stop_id}/departures', params=params)
+        response.raise_for_status()
+        departures = response.json().get('departures', [])
+        platforms = [
+            (datetime.fromisoformat(departure['plannedWhen']), f"Platform {departure['platform']} towards {departure['direction']}")
+            for departure in departures
+            if departure.get('platform') and departure.get('plannedWhen')
+        ]
+        return {'departures': departures, 'platforms': platforms}
+
+    def _store(self, key, entry):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), entry)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def _refresh(self, key):
+        try:
+            self._store(key, self._fetch(*key))
+        except requests.exceptions.RequestException as e:
+            logger.warning('background refresh of departures %s failed: %s', key, e)
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def get(self, stop_id, duration=None):
+        key = (stop_id, duration)
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is not None:
+                age = time.monotonic() - cached[0]
+                if age < self.ttl:
+                    self.hits += 1
+                    self.entries.move_to_end(key)
+                    return cached[1]
+                if age < self.stale_ttl:
+                    self.stale_hits += 1
+                    self.entries.move_to_end(key)
+                    if key not in self.refreshing:
+                        self.refreshing.add(key)
+                        threading.Thread(target=self._refresh, args=(key,), daemon=True).start()
+                    return cached[1]
+            self.misses += 1
+        entry = self._fetch(stop_id, duration)
+        self._store(key, entry)
+        return entry
+
+    def next_departure(self, stop_id, window=timedelta(minutes=120)):
+        now = datetime.now(timezone.utc)
+        for departure_time, text in self.get(stop_id)['platforms']:
+            if now <= departure_time <= now + window:
+                return text
+        return None
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'hits': self.hits, 'stale_hits': self.stale_hits, 'misses': self.misses}
+
+
+departures_cache = DeparturesCache(upstream)
+
+
+class PoiCache:
+    """Nearby POI names persisted in poi_cache, one row per grid cell.
+
+    Coordinates are snapped to a `step` degree grid (0.001 is about 110 m of
+    latitude) and the upstream lookup is made from the cell centre, so every
+    stop in the same cell shares one row until it expires.
+    """
+    def __init__(self, pool, step=0.001, ttl=7 * 24 * 3600):
+        self.pool = pool
+        self.step = step
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def cell(self, latitude, longitude):
+        return f'{round(latitude / self.step)}:{round(longitude / self.step)}'
+
+    def centre(self, cell):
+        row, column = cell.split(':')
+        return round(int(row) * self.step, 6), round(int(column) * self.step, 6)
+
+    def get(self, cell):
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT poi_names FROM poi_cache WHERE cell = ? AND expires_at > ?', (cell, time.time())).fetchone()
+        with self.lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, cell, poi_names):
+        now = time.time()
+        with self.pool.connection() as conn:
+            conn.execute('DELETE FROM poi_cache WHERE expires_at <= ?', (now,))
+            conn.execute('INSERT OR REPLACE INTO poi_cache (cell, poi_names, expires_at) VALUES (?, ?, ?)',
+                         (cell, json.dumps(poi_names), now + self.ttl))
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+poi_cache = PoiCache(db)
+
+
+class LLMCache:
+    """Generated text persisted in llm_cache, keyed by model and prompt.
+
+    Prompts are compared after collapsing whitespace and case, so the same
+    operator asked about from different stops is generated once.  Concurrent
+    requests for one prompt share a single call, and the least recently used
+    rows are evicted once the stored text exceeds `max_bytes`.
+    """
+    def __init__(self, pool, model, model_name=None, max_bytes=8 * 1024 * 1024):
+        self.pool = pool
+        self.model = model
+        self.model_name = model_name or getattr(model, 'model_name', type(model).__name__)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.hits = self.misses = 0
+
+    def key(self, prompt):
+        normalized = ' '.join(prompt.split()).casefold()
+        return hashlib.sha256(f'{self.model_name}\0{normalized}'.encode('utf-8')).hexdigest()
+
+    def _lookup(self, key):
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT response FROM llm_cache WHERE prompt_key = ?', (key,)).fetchone()
+            if row is not None:
+                conn.execute('UPDATE llm_cache SET last_used = ? WHERE prompt_key = ?', (time.time(), key))
+        return row[0] if row is not None else None
+
+    def _store(self, key, prompt, text):
+        with self.pool.connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO llm_cache (prompt_key, model, prompt, response, size, last_used) VALUES (?, ?, ?, ?, ?, ?)',
+                         (key, self.model_name, prompt, text, len(text.encode('utf-8')), time.time()))
+            conn.execute('''
+                DELETE FROM llm_cache WHERE prompt_key IN (
+                    SELECT prompt_key FROM (
+                        SELECT prompt_key, SUM(size) OVER (ORDER BY last_used DESC, prompt_key) AS running FROM llm_cache
+                    ) WHERE running > ?
+                )
+            ''', (self.max_bytes,))
+
+    def generate(self, prompt):
+        """Return the model's text for `prompt`, or None if it gave none."""
+        key = self.key(prompt)
+        with self.lock:
+            gate = self.inflight.setdefault(key, threading.Lock())
+        with gate:
+            try:
+                text = self._lookup(key)
+                with self.lock:
+                    if text is not None:
+                        self.hits += 1
+                        return text
+                    self.misses += 1
+                with metrics.timer('gemini_request_seconds', model=self.model_name):
+                    response = self.model.generate_content(prompt)
+                text = response.text if response else None
+                if text:
+                    self._store(key, prompt, text)
+                return text
+            finally:
+                with self.lock:
+                    if self.inflight.get(key) is gate:
+                        del self.inflight[key]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+class ConfigurationError(RuntimeError):
+    """A setting needed by the requested feature is missing."""
+
+
+class LazyGemini:
+    """Stands in for genai.GenerativeModel until the first generate_content.
+
+    google.generativeai and its grpc stack take most of this module's import
+    time, and workers that only serve /stops never need them.  The import,
+    the GOOGLE_API_KEY check and genai.configure happen on first use.
+    """
+    def __init__(self, name):
+        self.model_name = f'models/{name}'
+        self.name = name
+        self.model = None
+        self.lock = threading.Lock()
+
+    def _load(self):
+        with self.lock:
+            if self.model is None:
+                api_key = os.environ.get('GOOGLE_API_KEY')
+                if not api_key:
+                    raise ConfigurationError('GOOGLE_API_KEY is not set')
+                import google.generativeai as genai
+                genai.configure(api_key=api_key)
+                self.model = genai.GenerativeModel(self.name)
+        return self.model
+
+    def generate_content(self, prompt):
+        return (self.model or self._load()).generate_content(prompt)
+
+
+gemini = LazyGemini('gemini-pro')
+llm_cache = LLMCache(db, gemini)
+llm_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('GEMINI_CONCURRENCY', 5)), thread_name_prefix='llm')
+llm_timeout = float(os.environ.get('GEMINI_TIMEOUT', 30))
+probe_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='probe')
+guide_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('GUIDE_WORKERS', 2)), thread_name_prefix='guide')
+# a job not updated for this long is taken to belong to a dead process;
+# running jobs refresh updated_at every third of it
+guide_lease = int(os.environ.get('GUIDE_LEASE', 600))
+
+
+def submit_in_context(pool, fn, *args):
+    # ThreadPoolExecutor does not carry contextvars over to its threads; each
+    # call gets its own copy, which still refers to the request's breakdown
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    metrics.inc('http_requests_in_flight')
+    if request.headers.get('X-Profile'):
+        g.metrics_token = metrics.breakdown.set({})
+
+
+@app.after_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.metrics_start
+    breakdown = metrics.breakdown.get()
+    if breakdown is not None:
+        # Server-Timing durations are in milliseconds
+        parts = [f'{component};dur={seconds * 1000:.2f}' for component, seconds in sorted(breakdown.items())]
+        response.headers['Server-Timing'] = ', '.join(parts + [f'total;dur={elapsed * 1000:.2f}'])
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe('http_request_seconds', elapsed, route=route, method=request.method, status=response.status_code)
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if 'metrics_start' in g:
+        metrics.inc('http_requests_in_flight', -1)
+    if 'metrics_token' in g:
+        metrics.breakdown.reset(g.metrics_token)
+
+
 parser1 = reqparse.RequestParser()
 parser1.add_argument('query', type=str, required=True, help='Query string to search for stops')
+parser1.add_argument('after', type=int, required=False, help='List only stops with a greater stop_id')
+parser1.add_argument('limit', type=int, required=False, default=100, help='Maximum number of stops to list (1-1000)')
 parser2 = reqparse.RequestParser()
 parser2.add_argument('include', type=str, required=False, help='Comma-separated fields to include in the response')
+parser4 = reqparse.RequestParser()
+parser4.add_argument('after', type=int, required=False, help='List only stops with a greater stop_id')
+parser4.add_argument('limit', type=int, required=False, default=100, help='Maximum number of stops to list (1-10000)')
+parser3 = reqparse.RequestParser()
+parser3.add_argument('latitude', type=float, required=False, help='Centre latitude for a radius search')
+parser3.add_argument('longitude', type=float, required=False, help='Centre longitude for a radius search')
+parser3.add_argument('radius', type=float, required=False, help='Search radius in metres (up to 50000)')
+parser3.add_argument('min_latitude', type=float, required=False, help='South edge of a bounding box')
+parser3.add_argument('max_latitude', type=float, required=False, help='North edge of a bounding box')
+parser3.add_argument('min_longitude', type=float, required=False, help='West edge of a bounding box')
+parser3.add_argument('max_longitude', type=float, required=False, help='East edge of a bounding box')
+parser3.add_argument('limit', type=int, required=False, default=100, help='Maximum number of stops to list (1-1000)')
 stop_update = api.model('StopUpdate', {
     'name': fields.String(description='The new name of the stop'),
     'latitude': fields.Float(description='The new latitude of the stop'),
     'longitude': fields.Float(description='The new longitude of the stop'),
 })
+upsert_stop_sql = '''
+    INSERT INTO stops (stop_id, name, latitude, longitude, last_updated)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(stop_id) DO UPDATE SET
+    name=excluded.name,
+    latitude=excluded.latitude,
+    longitude=excluded.longitude,
+    last_updated=excluded.last_updated
+'''
+
+
+def serialize_stop(row):
+    return {
+        'stop_id': row['stop_id'],
+        'name': row['name'],
+        'latitude': row['latitude'],
+        'longitude': row['longitude'],
+        'last_updated': row['last_updated'],
+        '_links': {
+            'self': {
+                'href': f"http://{request.host}/stops/{row['stop_id']}"
+            }
+        }
+    }
+
+
+# the row and both neighbours in one statement; each subquery is a single
+# primary key index probe
+stop_with_neighbours_sql = '''
+    SELECT s.stop_id, s.name, s.latitude, s.longitude, s.last_updated,
+           (SELECT stop_id FROM stops WHERE stop_id < s.stop_id ORDER BY stop_id DESC LIMIT 1) AS prev_id,
+           (SELECT stop_id FROM stops WHERE stop_id > s.stop_id ORDER BY stop_id ASC LIMIT 1) AS next_id
+    FROM stops s WHERE s.stop_id = ?
+'''
+
+
+def stop_etag(stop, include_args, next_departure, host):
+    # last_updated only has second resolution, so the rest of what goes into
+    # the body is folded into a short digest as well
+    digest = hashlib.sha1(json.dumps([list(stop), include_args, next_departure, host]).encode('utf-8')).hexdigest()[:16]
+    return f"{stop['stop_id']}-{''.join(ch for ch in str(stop['last_updated']) if ch.isdigit())}-{digest}"
+
+
+def list_stops_page(conn, after=None, limit=100):
+    # keyset pagination on the primary key: cost depends on limit, not table size
+    rows = conn.execute(
+        'SELECT stop_id, name, latitude, longitude, last_updated FROM stops WHERE stop_id > ? ORDER BY stop_id LIMIT ?',
+        (after if after is not None else -1, limit + 1)).fetchall()
+    return rows[:limit], len(rows) > limit
+
+
+def page_bounds(conn, after, limit):
+    # walks only the primary key index: the last stop_id on a full page (None
+    # for the final, short page) and whether another row follows it
+    ids = conn.execute('SELECT stop_id FROM stops WHERE stop_id > ? ORDER BY stop_id LIMIT 2 OFFSET ?',
+                       (after, limit - 1)).fetchall()
+    return (ids[0][0] if ids else None), len(ids) > 1
+
+
+def stream_stops(after, last_id, limit, batch=256):
+    # rows are encoded batch by batch as they come off the cursor, so the page
+    # is never held in memory as a whole
+    with db.connection() as conn:
+        cursor = conn.execute(
+            'SELECT stop_id, name, latitude, longitude, last_updated FROM stops WHERE stop_id > ? AND stop_id <= ? ORDER BY stop_id LIMIT ?',
+            (after, last_id if last_id is not None else 2 ** 63 - 1, limit))
+        yield '['
+        separator = ''
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                break
+            yield separator + ','.join(json.dumps(serialize_stop(row)) for row in rows)
+            separator = ','
+        yield ']'
+
+
+def stops_in_box(conn, min_lat, max_lat, min_lon, max_lon):
+    # stops_rtree stores 32 bit floats rounded outwards, so the exact bounds
+    # are checked again on the stops row
+    return conn.execute('''
+        SELECT s.stop_id, s.name, s.latitude, s.longitude, s.last_updated
+        FROM stops_rtree r JOIN stops s ON s.stop_id = r.id
+        WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?
+        AND s.latitude BETWEEN ? AND ? AND s.longitude BETWEEN ? AND ?
+        ORDER BY s.stop_id
+    ''', (min_lat, max_lat, min_lon, max_lon, min_lat, max_lat, min_lon, max_lon)).fetchall()
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371008.8 * math.asin(math.sqrt(a))
+
+
+@api.route('/metrics')
+class Metrics(Resource):
+    def get(self):
+        caches = [('departures', departures_cache), ('poi', poi_cache), ('llm', llm_cache)]
+        collectors = [
+            ('cache_hits_total', 'counter', [({'cache': name}, cache.stats()['hits']) for name, cache in caches]),
+            ('cache_misses_total', 'counter', [({'cache': name}, cache.stats()['misses']) for name, cache in caches]),
+            ('cache_stale_hits_total', 'counter', [({'cache': 'departures'}, departures_cache.stats()['stale_hits'])]),
+            ('db_pool_idle_connections', 'gauge', [({}, db.idle.qsize())]),
+        ]
+        return Response(metrics.render(collectors), mimetype='text/plain; version=0.0.4')
+
+
 @api.route('/stops')
 class StopsResource(Resource):
+    @api.expect(parser4)
+    def get(self):
+        args = parser4.parse_args()
+        limit = args['limit']
+        if not 1 <= limit <= 10000:
+            return make_response('{"message": "Bad Request: limit must be between 1 and 10000."}', 400)
+        after = args['after'] if args['after'] is not None else -1
+        with db.connection() as conn:
+            last_id, has_more = page_bounds(conn, after, limit)
+        response = Response(stream_with_context(stream_stops(after, last_id, limit)), mimetype='application/json', status=200)
+        if has_more:
+            response.headers['Link'] = f'<http://{request.host}/stops?after={last_id}&limit={limit}>; rel="next"'
+        return response
+
     @api.expect(parser1)
     def put(self):
         args = parser1.parse_args()
         query = args['query']
         if not query:
             return make_response('{"message": "Bad Request: Query parameter is required."}', 400)
-        response = requests.get(f'https://v6.db.transport.rest/locations?query={query}')
+        limit = args['limit']
+        if not 1 <= limit <= 1000:
+            return make_response('{"message": "Bad Request: limit must be between 1 and 1000."}', 400)
+        try:
+            response = upstream.get('locations', '/locations', params={'query': query})
+        except requests.exceptions.ConnectionError:
+            return make_response('{"message": "Service Unavailable: Error in external API."}', 503)
         if response.status_code != 200:
             return make_response('{"message": "Not Found: No stops found with the provided query."}',response.status_code)
         stops_data = response.json()
@@ -66,58 +825,74 @@ class StopsResource(Resource):
             return make_response('{"message": "Not Found: No stops found with the provided query."}', 404)
         response_status = 200
         try:
-            with sqlite3.connect(db_file) as conn:
-                conn.row_factory = sqlite3.Row
-                cur = conn.cursor()
-                new_stops_added = False
-                for stop in stops_data[:5]:
-                    if stop['type'] == 'stop' and 'location' in stop:
-                        stop_id = stop['id']
-                        name = stop.get('name', 'Unknown')
-                        latitude = stop['location']['latitude']
-                        longitude = stop['location']['longitude']
-                        last_updated = datetime.now().strftime('%Y-%m-%d-%H:%M:%S')
-                        cur.execute('SELECT 1 FROM stops WHERE stop_id = ?', (stop_id,))
-                        exists = cur.fetchone()
-                        cur.execute('''
-                            INSERT INTO stops (stop_id, name, latitude, longitude, last_updated)
-                            VALUES (?, ?, ?, ?, ?)
-                            ON CONFLICT(stop_id) DO UPDATE SET
-                            name=excluded.name,
-                            latitude=excluded.latitude,
-                            longitude=excluded.longitude,
-                            last_updated=excluded.last_updated
-                        ''', (stop_id, name, latitude, longitude, last_updated))
-
-                        if not exists:
-                            new_stops_added = True
-                conn.commit()
-                if new_stops_added:
-                    response_status = 201
-                cur.execute('SELECT * FROM stops ORDER BY stop_id')
-                stops_list = cur.fetchall()
-                serialized_stops = [
-                    {
-                        'stop_id': row['stop_id'],
-                        'name': row['name'],
-                        'latitude': row['latitude'],
-                        'longitude': row['longitude'],
-                        'last_updated': row['last_updated'],
-                        '_links': {
-                            'self': {
-                                'href': f"http://{request.host}/stops/{row['stop_id']}"
-                            }
-                        }
-                    } for row in stops_list
-                ]
+            last_updated = datetime.now().strftime('%Y-%m-%d-%H:%M:%S')
+            rows = {}
+            for stop in stops_data[:5]:
+                if stop['type'] == 'stop' and 'location' in stop:
+                    rows[stop['id']] = (stop['id'], stop.get('name', 'Unknown'), stop['location']['latitude'],
+                                        stop['location']['longitude'], last_updated)
+            with db.connection() as conn:
+                if rows:
+                    placeholders = ', '.join('?' * len(rows))
+                    existing = conn.execute(f'SELECT COUNT(*) FROM stops WHERE stop_id IN ({placeholders})',
+                                            list(rows)).fetchone()[0]
+                    conn.executemany(upsert_stop_sql, rows.values())
+                    if existing < len(rows):
+                        response_status = 201
+                stops_list, has_more = list_stops_page(conn, args['after'], limit)
+            serialized_stops = [serialize_stop(row) for row in stops_list]
             json_data = json.dumps(serialized_stops)
-            return Response(json_data, mimetype='application/json', status=response_status)
+            response = Response(json_data, mimetype='application/json', status=response_status)
+            if has_more:
+                next_url = f"http://{request.host}/stops?after={stops_list[-1]['stop_id']}&limit={limit}"
+                response.headers['Link'] = f'<{next_url}>; rel="next"'
+            return response
         except requests.exceptions.HTTPError as e:
             return make_response(
                 '{"message": "Bad Request: Failed to fetch data from external API.", "error": ' + str(e) + '}', 400)
         except requests.exceptions.ConnectionError:
             return make_response('{"message": "Service Unavailable: Error in external API."}', 503)
 
+
+@api.route('/stops/nearby')
+class NearbyStops(Resource):
+    @api.expect(parser3)
+    def get(self):
+        args = parser3.parse_args()
+        limit = args['limit']
+        if not 1 <= limit <= 1000:
+            return make_response('{"message": "Bad Request: limit must be between 1 and 1000."}', 400)
+        centre = [args[key] for key in ('latitude', 'longitude', 'radius')]
+        box = [args[key] for key in ('min_latitude', 'max_latitude', 'min_longitude', 'max_longitude')]
+        if all(value is not None for value in centre) and all(value is None for value in box):
+            latitude, longitude, radius = centre
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and 0 < radius <= 50000):
+                return make_response('{"message": "Bad Request: latitude, longitude or radius out of range."}', 400)
+            lat_delta = math.degrees(radius / 6371008.8)
+            lon_delta = lat_delta / max(math.cos(math.radians(latitude)), 1e-6)
+            with db.connection() as conn:
+                rows = stops_in_box(conn, latitude - lat_delta, latitude + lat_delta, longitude - lon_delta, longitude + lon_delta)
+            matches = sorted(
+                (distance, row) for row in rows
+                for distance in [haversine(latitude, longitude, row['latitude'], row['longitude'])]
+                if distance <= radius)
+            stops_list = []
+            for distance, row in matches[:limit]:
+                stop = serialize_stop(row)
+                stop['distance'] = round(distance, 1)
+                stops_list.append(stop)
+        elif all(value is not None for value in box) and all(value is None for value in centre):
+            min_lat, max_lat, min_lon, max_lon = box
+            if min_lat > max_lat or min_lon > max_lon:
+                return make_response('{"message": "Bad Request: bounding box minimum exceeds maximum."}', 400)
+            with db.connection() as conn:
+                rows = stops_in_box(conn, min_lat, max_lat, min_lon, max_lon)
+            stops_list = [serialize_stop(row) for row in rows[:limit]]
+        else:
+            return make_response('{"message": "Bad Request: give either latitude, longitude and radius or a full bounding box."}', 400)
+        return Response(json.dumps(stops_list), mimetype='application/json', status=200)
+
+
 @api.route('/stops/<int:stop_id>')
 class Stop(Resource):
     @api.expect(parser2)
@@ -128,60 +903,47 @@ class Stop(Resource):
         for field in include_fields:
             if field not in ['name', 'latitude', 'longitude', 'last_updated', 'next_departure']:
                 return make_response(json.dumps({"message": "Bad Request: Invalid fields in include parameter."}), 400)
-        conn = sqlite3.connect(db_file)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM stops WHERE stop_id = ?', (stop_id,))
-        stop = cursor.fetchone()
+        with db.connection() as conn:
+            stop = conn.execute(stop_with_neighbours_sql, (stop_id,)).fetchone()
         if not stop:
-            conn.close()
             return make_response(json.dumps({"message": "Stop not found"}), 404)
         response_data = {"stop_id": stop[0]}
         fields_mapping = ['name', 'latitude', 'longitude','last_updated']
         for index, field in enumerate(fields_mapping, start=1):
             if not include_args or field in include_fields:
                 response_data[field] = stop[index]
+        next_departure = None
         if 'next_departure' in include_fields or not include_fields:
             try:
-                response = requests.get(f'https://v6.db.transport.rest/stops/{stop_id}/departures')
-                response.raise_for_status()
-            except requests.exceptions.HTTPError:
-                conn.close()
+                next_departure = departures_cache.next_departure(stop_id)
+            except (requests.exceptions.HTTPError, requests.exceptions.ConnectionError):
                 return make_response(json.dumps({"message": "Service Unavailable: Error fetching departures from external API."}), 503)
-            departures = response.json().get('departures', [])
-            next_departure = None
-            now = datetime.now(timezone.utc)
-            for departure in departures:
-                departure_time = datetime.fromisoformat(departure['plannedWhen'])
-                if 'platform' in departure and departure['platform'] and now <= departure_time <= now + timedelta(minutes=120):
-                    next_departure = f"Platform {departure['platform']} towards {departure['direction']}"
-                    response_data['next_departure'] = next_departure
-                    break
+            if next_departure:
+                response_data['next_departure'] = next_departure
+        etag = stop_etag(stop, include_args, next_departure, request.host)
+        # If-None-Match uses the weak comparison (RFC 7232 3.2), so W/"..." from
+        # a proxy or client still matches
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
         response_data["_links"] = {"self": {"href": f"http://{request.host}/stops/{stop_id}"}}
-        cursor.execute('SELECT stop_id FROM stops WHERE stop_id < ? ORDER BY stop_id DESC LIMIT 1', (stop_id,))
-        prev_stop = cursor.fetchone()
-        cursor.execute('SELECT stop_id FROM stops WHERE stop_id > ? ORDER BY stop_id ASC LIMIT 1', (stop_id,))
-        next_stop = cursor.fetchone()
-        if next_stop:
-            response_data["_links"]["next"] = {"href": f"http://{request.host}/stops/{next_stop[0]}"}
-        if prev_stop:
-            response_data["_links"]["prev"] = {"href": f"http://{request.host}/stops/{prev_stop[0]}"}
-
-        conn.close()
-        return Response(json.dumps(response_data), mimetype='application/json', status=200)
+        if stop['next_id'] is not None:
+            response_data["_links"]["next"] = {"href": f"http://{request.host}/stops/{stop['next_id']}"}
+        if stop['prev_id'] is not None:
+            response_data["_links"]["prev"] = {"href": f"http://{request.host}/stops/{stop['prev_id']}"}
+
+        response = Response(json.dumps(response_data), mimetype='application/json', status=200)
+        response.set_etag(etag)
+        return response
 
     def delete(self, stop_id):
-        conn = sqlite3.connect(db_file)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM stops WHERE stop_id = ?', (stop_id,))
-        stop = cursor.fetchone()
-        if stop:
-            cursor.execute('DELETE FROM stops WHERE stop_id = ?', (stop_id,))
-            conn.commit()
-            conn.close()
+        with db.connection() as conn:
+            deleted = conn.execute('DELETE FROM stops WHERE stop_id = ?', (stop_id,)).rowcount
+        if deleted:
             return make_response(json.dumps(
                 {"message": "The stop_id {} was removed from the database.".format(stop_id), "stop_id": stop_id}), 200)
         else:
-            conn.close()
             return make_response(json.dumps(
                 {"message": "The stop_id {} was not found in the database.".format(stop_id), "stop_id": stop_id}), 404)
 
@@ -201,12 +963,10 @@ class Stop(Resource):
         last_updated = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         update_values.append(last_updated)
         update_values.append(stop_id)
-        conn = sqlite3.connect(db_file)
-        cursor = conn.cursor()
-        cursor.execute(f'UPDATE stops SET {update_parts} WHERE stop_id = ?', update_values)
-        changes = conn.total_changes
-        conn.commit()
-        conn.close()
+        with db.connection() as conn:
+            # pooled connections are long lived, so total_changes would count
+            # earlier requests too
+            changes = conn.execute(f'UPDATE stops SET {update_parts} WHERE stop_id = ?', update_values).rowcount
         if changes == 0:
             return {"message": "Stop not found"}, 404
         response_data = {
@@ -225,16 +985,22 @@ class Stop(Resource):
 class OperatorProfiles(Resource):
     def get(self, stop_id):
         try:
-            departures_response = requests.get(f'https://v6.db.transport.rest/stops/{stop_id}/departures', params={'duration': 90})
-            departures_response.raise_for_status()
-            departures_data = departures_response.json()
-            departures = departures_data['departures']
-            operator_names = {departure.get('line', {}).get('operator', {}).get('name') for departure in departures if departure.get('line', {}).get('operator', {}).get('name')}
+            departures = departures_cache.get(stop_id, 90)['departures']
+            # first seen order, so the same departures always give the same five
+            operator_names = dict.fromkeys(departure.get('line', {}).get('operator', {}).get('name') for departure in departures if departure.get('line', {}).get('operator', {}).get('name'))
+            operator_names = list(operator_names)[:5]
+            futures = [submit_in_context(llm_pool, llm_cache.generate, f"Tell me about the operator {operator_name}.") for operator_name in operator_names]
+            deadline = time.monotonic() + llm_timeout
             profiles = []
-            for operator_name in list(operator_names)[:5]:
-                question = f"Tell me about the operator {operator_name}."
-                gemini_response = gemini.generate_content(question)
-                information_text = gemini_response.text if gemini_response else "No information available."
+            for operator_name, future in zip(operator_names, futures):
+                try:
+                    information_text = future.result(timeout=max(0, deadline - time.monotonic())) or "No information available."
+                except FutureTimeout:
+                    # a call still queued is dropped so the shared pool's
+                    # backlog cannot grow; one already running finishes and
+                    # fills llm_cache for next time
+                    future.cancel()
+                    information_text = "No information available."
                 information_text = information_text.replace('\n', ' ').replace('**', '').replace("*",'')
                 profiles.append({
                     "operator_name": operator_name,
@@ -274,22 +1040,27 @@ class TourismGuide(Resource):
             }
         }
     def find_nearby_pois(self,latitude, longitude):
-        response = requests.get(
-            'https://v6.db.transport.rest/locations/nearby',
-            params={
-                'latitude': latitude,
-                'longitude': longitude,
-                'results': 10,
-                'distance': 1000,
-                'stops': 'true',
-                'poi': 'true'
-            }
-        )
-        # Parses the response and filters out items with poi=true
-        poi_items = [item for item in response.json() if item.get('poi') is True]
-        if not poi_items:
+        cell = poi_cache.cell(latitude, longitude)
+        poi_names = poi_cache.get(cell)
+        if poi_names is None:
+            latitude, longitude = poi_cache.centre(cell)
+            response = upstream.get(
+                'nearby', '/locations/nearby',
+                params={
+                    'latitude': latitude,
+                    'longitude': longitude,
+                    'results': 10,
+                    'distance': 1000,
+                    'stops': 'true',
+                    'poi': 'true'
+                }
+            )
+            response.raise_for_status()
+            # Parses the response and filters out items with poi=true
+            poi_names = [item['name'] for item in response.json() if item.get('poi') is True]
+            poi_cache.put(cell, poi_names)
+        if not poi_names:
             return False
-        poi_names = [item['name'] for item in poi_items]
         return poi_names
 
     def extract_origin_destination(journey_data):
@@ -311,10 +1082,7 @@ class TourismGuide(Resource):
             'from': from_id,
             'to': to_id
         }
-        response = requests.get(
-            'https://v6.db.transport.rest/journeys',
-            params=params
-        )
+        response = upstream.get('journeys', '/journeys', params=params)
         if response.status_code == 200:
             data = response.json()
             if data.get('journeys'):
@@ -325,41 +1093,214 @@ class TourismGuide(Resource):
             print(f"API call failed with status code {response.status_code}")
             return False, None
 
-    def get(self):
-        with sqlite3.connect(db_file) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT stop_id, name, latitude, longitude FROM stops')
-            stops = cursor.fetchall()
-        for i, from_stop in enumerate(stops):
-            for to_stop in stops[i+1:]:
-                has_journey, journey_data = self.check_journey_exists(from_stop[0],to_stop[0])
+    def first_journey(self, stops, window=16):
+        """Return the first (from_stop, to_stop) pair, in nested loop order,
+        that has a journey.  Up to `window` checks run ahead on probe_pool and
+        the rest are cancelled once the answer is known."""
+        pairs = combinations(stops, 2)
+        pending = deque()
+
+        def submit(pair):
+            pending.append((pair, submit_in_context(probe_pool, self.check_journey_exists, pair[0][0], pair[1][0])))
+
+        try:
+            for pair in pairs:
+                submit(pair)
+                if len(pending) >= window:
+                    break
+            while pending:
+                pair, future = pending.popleft()
+                has_journey, _ = future.result()
                 if has_journey:
-                    # Obtain POI names using the location of the start and end stops in the trip data
-                    poi_names_o = self.find_nearby_pois(from_stop[2], from_stop[3])
-                    poi_names_d = self.find_nearby_pois(to_stop[2], to_stop[3])
-                    #If there are POIs near the start and end points, then send a request to the Gemini API
-                    if poi_names_o and poi_names_d:
-                        question = f"Create a guide for a journey from {from_stop[1]} to {to_stop[1]}, " \
-                                   f"including points of interest like {', '.join(poi_names_o)} and {', '.join(poi_names_d)}."
-                        response = gemini.generate_content(question)
-                        guide_content = response.text
-                        temp_dir = tempfile.gettempdir()
-                        guide_file_name = f"{studentid}.txt"
-                        guide_file_path = os.path.join(temp_dir, guide_file_name)
+                    return pair
+                pair = next(pairs, None)
+                if pair is not None:
+                    submit(pair)
+        finally:
+            for _, future in pending:
+                future.cancel()
+        return None
+
+    def generate(self):
+        """Return (200, guide text) or (error status, message)."""
+        with db.connection() as conn:
+            stops = conn.execute('SELECT stop_id, name, latitude, longitude FROM stops').fetchall()
+        try:
+            pair = self.first_journey(stops)
+            if pair:
+                from_stop, to_stop = pair
+                # Obtain POI names using the location of the start and end stops in the trip data
+                origin = submit_in_context(probe_pool, self.find_nearby_pois, from_stop[2], from_stop[3])
+                destination = submit_in_context(probe_pool, self.find_nearby_pois, to_stop[2], to_stop[3])
+                poi_names_o, poi_names_d = origin.result(), destination.result()
+        except (requests.exceptions.HTTPError, requests.exceptions.ConnectionError):
+            return 503, 'Service Unavailable: Error checking journeys with external API.'
+        if pair:
+            #If there are POIs near the start and end points, then send a request to the Gemini API
+            if poi_names_o and poi_names_d:
+                question = f"Create a guide for a journey from {from_stop[1]} to {to_stop[1]}, " \
+                           f"including points of interest like {', '.join(poi_names_o)} and {', '.join(poi_names_d)}."
+                guide_content = llm_cache.generate(question)
+                if guide_content:
+                    return 200, guide_content
+            return 500, 'Failed to generate content with Gemini API'
+
+        return 404, 'No valid journey or POIs found between stops'
+
+    def get(self):
+        status, content = self.generate()
+        if status != 200:
+            return {'message': content}, status
+        return send_guide(content)
+
+    def post(self):
+        job_id = uuid.uuid4().hex
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with db.connection() as conn:
+            conn.execute("INSERT INTO guide_jobs (job_id, status, created_at, updated_at) VALUES (?, 'queued', ?, ?)",
+                         (job_id, now, now))
+        guide_pool.submit(run_guide_job, job_id)
+        job_url = f"http://{request.host}/guide/jobs/{job_id}"
+        return {"job_id": job_id, "status": "queued", "_links": {"self": {"href": job_url}}}, 202, {'Location': job_url}
+
+
+@api.route('/guide/jobs/<string:job_id>')
+class GuideJob(Resource):
+    def get(self, job_id):
+        with db.connection() as conn:
+            job = conn.execute('SELECT job_id, status, http_status, message, created_at, updated_at FROM guide_jobs WHERE job_id = ?',
+                               (job_id,)).fetchone()
+        if not job:
+            return {'message': 'Job not found'}, 404
+        if job['status'] in ('queued', 'running') and job['updated_at'] < guide_lease_expiry():
+            # its process died without finishing it; queue it here instead
+            if resume_guide_jobs(job_id):
+                return self.get(job_id)
+        response_data = {key: job[key] for key in ('job_id', 'status', 'created_at', 'updated_at')}
+        if job['status'] == 'failed':
+            response_data['error'] = {'status': job['http_status'], 'message': job['message']}
+        response_data['_links'] = {'self': {'href': f"http://{request.host}/guide/jobs/{job_id}"}}
+        if job['status'] == 'done':
+            response_data['_links']['result'] = {'href': f"http://{request.host}/guide/jobs/{job_id}/result"}
+        return response_data, 200
+
+
+@api.route('/guide/jobs/<string:job_id>/result')
+class GuideJobResult(Resource):
+    def get(self, job_id):
+        with db.connection() as conn:
+            job = conn.execute('SELECT status, http_status, message, guide FROM guide_jobs WHERE job_id = ?', (job_id,)).fetchone()
+        if not job:
+            return {'message': 'Job not found'}, 404
+        if job['status'] == 'failed':
+            return {'message': job['message']}, job['http_status']
+        if job['status'] != 'done':
+            return {'message': f"Guide is not ready yet, job is {job['status']}"}, 409
+        return send_guide(job['guide'])
+
+
+def send_guide(guide_content):
+    # served from memory: concurrent requests used to overwrite one shared
+    # file in the temp directory
+    return send_file(io.BytesIO(guide_content.encode('utf-8')), mimetype='text/plain', as_attachment=True,
+                     download_name=txt_file)
+
+
+def guide_lease_expiry():
+    return (datetime.now() - timedelta(seconds=guide_lease)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def beat_guide_job(job_id, stop):
+    # keeps a running job's lease fresh so no other process takes it over
+    while not stop.wait(guide_lease / 3):
+        with db.connection() as conn:
+            conn.execute("UPDATE guide_jobs SET updated_at = ? WHERE job_id = ? AND status = 'running'",
+                         (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), job_id))
+
+
+def run_guide_job(job_id):
+    # claim the job atomically so a job submitted twice (or by two processes)
+    # only runs once
+    with db.connection() as conn:
+        claimed = conn.execute("UPDATE guide_jobs SET status = 'running', updated_at = ? WHERE job_id = ? AND status = 'queued'",
+                               (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), job_id)).rowcount
+    if not claimed:
+        return
+    stop = threading.Event()
+    threading.Thread(target=beat_guide_job, args=(job_id, stop), daemon=True, name=f'guide-beat-{job_id[:8]}').start()
+    try:
+        status, content = TourismGuide().generate()
+    except ConfigurationError as e:
+        status, content = 503, f'Service Unavailable: {e}'
+    except Exception as e:
+        logger.exception('guide job %s failed', job_id)
+        status, content = 500, f'Failed to generate guide: {e}'
+    finally:
+        stop.set()
+    with db.connection() as conn:
+        if status == 200:
+            conn.execute("UPDATE guide_jobs SET status = 'done', http_status = 200, guide = ?, updated_at = ? WHERE job_id = ?",
+                         (content, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), job_id))
+        else:
+            conn.execute("UPDATE guide_jobs SET status = 'failed', http_status = ?, message = ?, updated_at = ? WHERE job_id = ?",
+                         (status, content, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), job_id))
+
+
+def resume_guide_jobs(job_id=None):
+    """Queue jobs left behind by a process that stopped, and submit them.
+
+    With no job_id (at startup) every queued job is submitted, and running
+    jobs are requeued once their lease has expired; a live process may
+    still be working on the others.  With a job_id, the job is requeued and
+    submitted only if its lease has expired, whether it was queued or
+    running.  Returns the number of jobs submitted.
+    """
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    with db.connection() as conn:
+        if job_id is None:
+            conn.execute("UPDATE guide_jobs SET status = 'queued', updated_at = ? WHERE status = 'running' AND updated_at < ?",
+                         (now, guide_lease_expiry()))
+            job_ids = [row[0] for row in conn.execute("SELECT job_id FROM guide_jobs WHERE status = 'queued' ORDER BY created_at")]
+        else:
+            # the conditional UPDATE lets only one of several pollers resubmit
+            expired = conn.execute("UPDATE guide_jobs SET status = 'queued', updated_at = ? "
+                                   "WHERE job_id = ? AND status IN ('queued', 'running') AND updated_at < ?",
+                                   (now, job_id, guide_lease_expiry())).rowcount
+            job_ids = [job_id] if expired else []
+    for job_id in job_ids:
+        guide_pool.submit(run_guide_job, job_id)
+    return len(job_ids)
+
 
-                        with open(guide_file_path, 'w', encoding='utf-8') as file:
-                            file.write(guide_content)
+@api.errorhandler(ConfigurationError)
+def handle_configuration_error(e):
+    return {'message': f'Service Unavailable: {e}'}, 503
 
-                        return send_file(guide_file_path, as_attachment=True, download_name=guide_file_name)
-                    else:
-                        return {'message': 'Failed to generate content with Gemini API'}, 500
 
-        return {'message': 'No valid journey or POIs found between stops'}, 404
+app_ready = False
+app_lock = threading.Lock()
 
 
+def create_app(resume_jobs=True):
+    """Prepare the database and return the app.
 
+    Safe to call more than once (e.g. from every worker's post-fork hook):
+    only the first call migrates and resumes jobs, and workers that each
+    resume the same queued job still run it once, as run_guide_job claims
+    it atomically.  The connections used for migrating are closed so a
+    pre-forking server does not hand them to its workers.
+    """
+    global app_ready
+    with app_lock:
+        if not app_ready:
+            init_db()
+            if resume_jobs:
+                resume_guide_jobs()
+            db.close()
+            app_ready = True
+    return app
 
 
 if __name__ == '__main__':
-    init_db()
-    app.run(debug=True)
+    # only the reloader's child process serves requests
+    create_app(resume_jobs=os.environ.get('WERKZEUG_RUN_MAIN') == 'true').run(debug=True)
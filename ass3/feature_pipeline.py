@@ -0,0 +1,111 @@
+"""FeaturePipeline for the car insurance frames, shared by training and scoring.
+
+It lives outside zxxxxxx.py so a pickled pipeline refers to
+feature_pipeline.FeaturePipeline, which a scoring process can import
+without running the training script.
+"""
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+
+def parse_age_of_car(value):
+    years = re.search(r'(\d+) years', value)
+    months = re.search(r'(\d+) months', value)
+    return [(float(years.group(1)) if years else 0.0) * 12 + (float(months.group(1)) if months else 0.0)]
+
+
+def parse_torque(value):
+    match = re.search(r'(\d+\.?\d*)Nm@(\d+)rpm', value)
+    return [float(match.group(1)), float(match.group(2))] if match else [np.nan, np.nan]
+
+
+def parse_power(value):
+    match = re.search(r'(\d+\.?\d*)bhp@(\d+)rpm', value)
+    return [float(match.group(1)), float(match.group(2))] if match else [np.nan, np.nan]
+
+
+class FeaturePipeline:
+    """Fit/transform replacement for a per-frame get_dummies preprocess.
+
+    fit() learns each categorical column's vocabulary (sorted, as get_dummies
+    orders it) from the training frame.  transform() then emits the same
+    columns in the same order for any frame: one-hot blocks are uint8, and
+    categories not seen in fit (or missing) get an all-zero row.  The object
+    only holds lists and dicts, so it pickles for reuse at scoring time.
+    """
+    bool_columns = [
+        'is_esc', 'is_adjustable_steering', 'is_tpms', 'is_parking_sensors', 'is_parking_camera',
+        'is_front_fog_lights', 'is_rear_window_wiper', 'is_rear_window_washer',
+        'is_rear_window_defogger', 'is_brake_assist', 'is_power_door_locks', 'is_central_locking',
+        'is_power_steering', 'is_driver_seat_height_adjustable', 'is_day_night_rear_view_mirror',
+        'is_ecw', 'is_speed_alert'
+    ]
+    categorical_cols = [
+        'area_cluster', 'segment', 'model', 'engine_type', 'fuel_type',
+        'transmission_type', 'steering_type', 'rear_brakes_type'
+    ]
+
+    def __init__(self, parse_cache_path=None):
+        self.parse_cache_path = parse_cache_path
+        self.parse_cache = {}
+        if parse_cache_path and os.path.exists(parse_cache_path):
+            with open(parse_cache_path) as f:
+                self.parse_cache = json.load(f)
+
+    def fit(self, df):
+        self.vocabularies_ = {col: sorted(df[col].dropna().unique()) for col in self.categorical_cols}
+        self.dummy_columns_ = [f'{col}_{value}' for col in self.categorical_cols for value in self.vocabularies_[col]]
+        return self
+
+    def transform(self, df):
+        parsed_before = sum(map(len, self.parse_cache.values()))
+        out = df.drop(columns=self.categorical_cols + ['max_torque', 'max_power'])
+        out['age_of_car'] = self._parse(df['age_of_car'], parse_age_of_car, [0.0])[:, 0]
+
+        # Replace yes/no with 0/1
+        out[self.bool_columns] = df[self.bool_columns].apply(lambda x: x.map({'Yes': 1, 'No': 0}))
+
+        # onehot: one uint8 block for every categorical column
+        block = np.zeros((len(df), len(self.dummy_columns_)), dtype=np.uint8)
+        rows = np.arange(len(df))
+        offset = 0
+        for col in self.categorical_cols:
+            vocabulary = self.vocabularies_[col]
+            codes = pd.Categorical(df[col], categories=vocabulary).codes
+            known = codes >= 0
+            block[rows[known], offset + codes[known]] = 1
+            offset += len(vocabulary)
+        dummies = pd.DataFrame(block, columns=self.dummy_columns_, index=df.index)
+
+        # Extract the values
+        torque = pd.DataFrame(self._parse(df['max_torque'], parse_torque, [np.nan, np.nan]),
+                              columns=['torque_value', 'torque_rpm'], index=df.index)
+        power = pd.DataFrame(self._parse(df['max_power'], parse_power, [np.nan, np.nan]),
+                             columns=['power_value', 'power_rpm'], index=df.index)
+        if self.parse_cache_path and sum(map(len, self.parse_cache.values())) != parsed_before:
+            with open(self.parse_cache_path, 'w') as f:
+                json.dump(self.parse_cache, f)
+        return pd.concat([out, dummies, torque, power], axis=1)
+
+    def _parse(self, series, parser, missing):
+        # parse each distinct string once and broadcast back through the
+        # factorized codes; code -1 (missing) picks the trailing `missing` row
+        codes, uniques = pd.factorize(series)
+        cache = self.parse_cache.setdefault(series.name, {})
+        table = np.empty((len(uniques) + 1, len(missing)))
+        for i, value in enumerate(uniques):
+            if not isinstance(value, str):
+                table[i] = missing
+                continue
+            if value not in cache:
+                cache[value] = parser(value)
+            table[i] = cache[value]
+        table[-1] = missing
+        return table[codes]
+
+    def fit_transform(self, df):
+        return self.fit(df).transform(df)
@@ -0,0 +1,57 @@
+"""Tests for FeaturePipeline, on the rows of ass3/test.csv.
+
+Run from the repository root with:  python -m unittest discover ass3/tests
+"""
+import pickle
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ass3 = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ass3))
+
+from feature_pipeline import FeaturePipeline  # noqa: E402
+
+frame = pd.read_csv(ass3 / 'test.csv')
+
+
+class FeaturePipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.train, self.score = frame.iloc[:2000].copy(), frame.iloc[2000:].copy()
+        self.pipeline = FeaturePipeline().fit(self.train)
+
+    def test_every_frame_gets_the_training_columns(self):
+        columns = list(self.pipeline.transform(self.train).columns)
+        self.assertEqual(list(self.pipeline.transform(self.score).columns), columns)
+        self.assertEqual(list(self.pipeline.transform(self.score.iloc[:1]).columns), columns)
+
+    def test_unknown_categories_get_an_all_zero_row(self):
+        row = self.score.iloc[:1].copy()
+        row['model'] = 'M99'
+        out = self.pipeline.transform(row)
+        self.assertEqual(out.filter(like='model_').to_numpy().sum(), 0)
+        self.assertEqual(out.filter(like='segment_').to_numpy().sum(), 1)
+
+    def test_pickled_pipeline_loads_in_a_scoring_process(self):
+        with tempfile.TemporaryDirectory() as work:
+            path = Path(work) / 'pipeline.pkl'
+            path.write_bytes(pickle.dumps(self.pipeline))
+            self.score.to_csv(Path(work) / 'score.csv', index=False)
+            # a fresh interpreter that never runs the training script
+            script = (f'import pickle, sys; sys.path.insert(0, {str(ass3)!r}); import pandas as pd; '
+                      f'p = pickle.load(open({str(path)!r}, "rb")); '
+                      f'p.transform(pd.read_csv({str(Path(work) / "score.csv")!r})).to_pickle({str(Path(work) / "out.pkl")!r})')
+            subprocess.run([sys.executable, '-c', script], check=True, cwd=work)
+            scored = pd.read_pickle(Path(work) / 'out.pkl')
+        expected = self.pipeline.transform(self.score)
+        pd.testing.assert_frame_equal(scored.reset_index(drop=True), expected.reset_index(drop=True))
+        self.assertTrue(np.all(scored.filter(like='fuel_type_').dtypes == np.uint8))
+
+
+if __name__ == '__main__':
+    unittest.main()
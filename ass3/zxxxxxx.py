@@ -1,45 +1,26 @@
 import pandas as pd
 import numpy as np
+import os
+import pickle
+import time
 from sklearn.preprocessing import PowerTransformer
 import xgboost as xgb
-from sklearn.feature_selection import SelectFromModel
+from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error
 from imblearn.over_sampling import SMOTE
 from sklearn.ensemble import GradientBoostingClassifier
 from sklearn.metrics import f1_score, confusion_matrix, classification_report
-def preprocess(df):
-    df['age_of_car'] = df['age_of_car'].str.extract('(\d+) years').astype(float).fillna(0) * 12 \
-                       + df['age_of_car'].str.extract('(\d+) months').astype(float).fillna(0)
-
-    # Replace yes/no with 0/1
-    bool_columns = [
-        'is_esc', 'is_adjustable_steering', 'is_tpms', 'is_parking_sensors', 'is_parking_camera',
-        'is_front_fog_lights', 'is_rear_window_wiper', 'is_rear_window_washer',
-        'is_rear_window_defogger', 'is_brake_assist', 'is_power_door_locks', 'is_central_locking',
-        'is_power_steering', 'is_driver_seat_height_adjustable', 'is_day_night_rear_view_mirror',
-        'is_ecw', 'is_speed_alert'
-    ]
-    df[bool_columns] = df[bool_columns].apply(lambda x: x.map({'Yes': 1, 'No': 0}))
-
-    # onehot
-    categorical_cols = [
-        'area_cluster', 'segment', 'model', 'engine_type', 'fuel_type',
-        'transmission_type', 'steering_type', 'rear_brakes_type'
-    ]
-    df = pd.get_dummies(df, columns=categorical_cols)
-
-    # Extract the values
-    df[['torque_value', 'torque_rpm']] = df['max_torque'].str.extract(r'(\d+\.?\d*)Nm@(\d+)rpm').astype(float)
-    df[['power_value', 'power_rpm']] = df['max_power'].str.extract(r'(\d+\.?\d*)bhp@(\d+)rpm').astype(float)
-    # Remove original columns
-    df.drop(['max_torque', 'max_power'], axis=1, inplace=True)
-    df = df * 1
-    return df
+from feature_pipeline import FeaturePipeline
 
 train_df = pd.read_csv('train.csv')
 test_df=pd.read_csv("test.csv")
-train_df=preprocess(train_df)
-test_df=preprocess(test_df)
+# vocabularies come from train only, so test gets exactly the same columns
+pipeline = FeaturePipeline(parse_cache_path='zxxxxxx.parse_cache.json')
+train_df=pipeline.fit_transform(train_df)
+test_df=pipeline.transform(test_df)
+# the fitted pipeline, for scoring new policies with the same columns
+with open('zxxxxxx.pipeline.pkl', 'wb') as f:
+    pickle.dump(pipeline, f)
 
 df1 = train_df.drop('Unnamed: 0', axis=1).drop(['policy_id'], axis=1).copy()
 df2 = test_df.drop('Unnamed: 0', axis=1).drop(['policy_id'], axis=1).copy()
@@ -69,28 +50,59 @@ best_params = {
     'objective': 'reg:squarederror',
     'random_state': 42
 }
-best_model = xgb.XGBRegressor(**best_params)
-best_model.fit(x_train_transformed, y_train1)
-
-# Extract the importance of features
-importances = best_model.feature_importances_
+# same model for the native API, on the histogram method across all cores
+train_params = {key: value for key, value in best_params.items() if key not in ('n_estimators', 'random_state')}
+train_params.update(seed=best_params['random_state'], tree_method='hist', nthread=os.cpu_count())
+
+# rows held out to pick the number of rounds by early stopping
+fit_rows, valid_rows = train_test_split(np.arange(len(x_train_transformed)), test_size=0.1, random_state=42)
+y_train1_array = y_train1.to_numpy()
+
+def train_stage(name, x):
+    """Pick the round count by early stopping on the hold-out rows, then
+    refit on every training row for that many rounds.
+
+    The quantile sketch is computed once per feature set, on all rows; the
+    hold-out fit reuses its bin cuts through ref=.  Validation stays a plain
+    DMatrix: evaluating on a QuantileDMatrix every round was slower than the
+    training itself.
+    """
+    start = time.perf_counter()
+    dtrain = xgb.QuantileDMatrix(x, y_train1_array)
+    dfit = xgb.QuantileDMatrix(x[fit_rows], y_train1_array[fit_rows], ref=dtrain)
+    dvalid = xgb.DMatrix(x[valid_rows], y_train1_array[valid_rows])
+    booster = xgb.train(train_params, dfit, num_boost_round=best_params['n_estimators'],
+                        evals=[(dvalid, 'valid')], early_stopping_rounds=10, verbose_eval=False)
+    rounds = booster.best_iteration + 1
+    mse = mean_squared_error(dvalid.get_label(), booster.predict(dvalid, iteration_range=(0, rounds)))
+    model = xgb.train(train_params, dtrain, num_boost_round=rounds)
+    print(f"{name}: {time.perf_counter() - start:.2f}s, {rounds} rounds, validation MSE {mse:.2f}")
+    return model
+
+best_model = train_stage('all features', x_train_transformed)
+
+# Extract the importance of features, normalised to sum to 1.  The refit
+# model has exactly the early-stopped number of trees, so all of them count
+gain = best_model.get_score(importance_type='gain')
+importances = np.array([gain.get(f'f{i}', 0.0) for i in range(x_train_transformed.shape[1])])
+importances = importances / importances.sum()
 feature_names = x_train1.columns
 importance_dict = dict(zip(feature_names, importances))
 
-# Create model selectors based on specific importance thresholds
+# keep features at or above a specific importance threshold
 threshold = 0.001
-selector = SelectFromModel(best_model, threshold=threshold, prefit=True)
+selected = importances >= threshold
 
 # Transform data by selector
-x_train_selected = selector.transform(x_train_transformed)
-x_test_selected = selector.transform(x_test_transformed)
+x_train_selected = x_train_transformed[:, selected]
+x_test_selected = x_test_transformed[:, selected]
 
-# retrain a new model
-selected_model = xgb.XGBRegressor(**best_params)
-selected_model.fit(x_train_selected, y_train1)
+# retrain a new model; the selected columns are sketched again, since a
+# DMatrix can only be sliced by rows and its bin cuts cover every column
+selected_model = train_stage(f'{selected.sum()} selected features', x_train_selected)
 
 # predict in test data
-y_pred_selected = selected_model.predict(x_test_selected)
+y_pred_selected = selected_model.inplace_predict(x_test_selected)
 mse_selected = mean_squared_error(y_test1, y_pred_selected)
 print(f"Mean Squared Error with selected features: {mse_selected:.2f}")
 y_pred_int = np.round(y_pred_selected).astype(int)